@@ -0,0 +1,82 @@
+# coding: utf-8
+#
+# Copyright (c) 2012-2013, Niklas Rosenstein
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and
+# documentation are those of the authors and should not be interpreted
+# as representing official policies,  either expressed or implied, of
+# the FreeBSD Project.
+r"""
+benchmarks.c4d_standin
+~~~~~~~~~~~~~~~~~~~~~~
+
+Minimal stand-in for the :mod:`c4d` module that allows importing
+:mod:`c4dtools` in the benchmarks outside of Cinema 4D.
+"""
+
+import os
+import sys
+import types
+
+# Import c4dtools from this source tree.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def install_c4d_standin():
+    r"""
+    Installs a minimal ``c4d`` module into ``sys.modules`` that allows
+    importing :mod:`c4dtools` without Cinema 4D. Does nothing if the
+    real module can be imported.
+    """
+
+    try:
+        import c4d
+        return False
+    except ImportError:
+        pass
+
+    class Stub(object):
+        def __init__(self, *args, **kwargs):
+            pass
+
+    c4d = types.ModuleType('c4d')
+    c4d.__file__ = __file__
+    c4d.Vector = c4d.Matrix = c4d.BaseContainer = Stub
+    c4d.PLUGINFLAG_COMMAND_HOTKEY = 0
+
+    for name in ('gui', 'plugins', 'bitmaps', 'documents', 'utils',
+                 'modules'):
+        module = types.ModuleType('c4d.' + name)
+        setattr(c4d, name, module)
+        sys.modules['c4d.' + name] = module
+
+    c4d.gui.GeDialog = type('GeDialog', (Stub,), {})
+    c4d.plugins.GeResource = type('GeResource', (Stub,), {})
+    c4d.plugins.CommandData = type('CommandData', (Stub,), {})
+    c4d.bitmaps.BaseBitmap = type('BaseBitmap', (Stub,), {})
+    sys.modules['c4d'] = c4d
+    return True
@@ -0,0 +1,163 @@
+# coding: utf-8
+#
+# Copyright (c) 2012-2013, Niklas Rosenstein
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and
+# documentation are those of the authors and should not be interpreted
+# as representing official policies,  either expressed or implied, of
+# the FreeBSD Project.
+r"""
+benchmarks.importer_is_local
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Measures :meth:`c4dtools.importer.Importer.is_local` for an importer with
+many search-paths against many module objects, similar to the check
+done for every module in ``sys.modules`` by the
+:class:`~c4dtools.importer.ProtectedEnvironment`. The directories are
+created in a temporary folder, a part of the search-paths is added
+through a symbolic link (where supported). Results are written as JSON
+to stdout or to the file passed with ``--output``.
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import shutil
+import tempfile
+import platform
+import argparse
+
+from c4d_standin import install_c4d_standin
+install_c4d_standin()
+
+from c4dtools import importer
+
+def make_tree(root, paths, modules):
+    r"""
+    Creates *paths* library folders in *root* with one module each and
+    returns ``(importer, module_objects)``. Half of the module objects
+    are located in the library folders, the others in a folder that is
+    not part of the importer.
+    """
+
+    imp = importer.Importer()
+    foreign = os.path.join(root, 'foreign')
+    os.mkdir(foreign)
+
+    has_symlink = hasattr(os, 'symlink')
+    for index in xrange(paths):
+        dirname = os.path.join(root, 'lib%d' % index)
+        os.mkdir(dirname)
+        if has_symlink and index % 2:
+            link = os.path.join(root, 'link%d' % index)
+            os.symlink(dirname, link)
+            imp.add(link)
+        else:
+            imp.add(dirname)
+
+    objects = []
+    for index in xrange(modules):
+        if index % 2:
+            dirname = os.path.join(root, 'lib%d' % (index % paths))
+        else:
+            dirname = foreign
+        filename = os.path.join(dirname, 'mod%d.py' % index)
+        with open(filename, 'w') as fp:
+            fp.write('\n')
+
+        module = types.ModuleType('mod%d' % index)
+        module.__file__ = filename
+        objects.append(module)
+
+    return imp, objects
+
+def run(configs, repeat):
+    results = []
+    for paths, modules in configs:
+        root = tempfile.mkdtemp()
+        try:
+            imp, objects = make_tree(root, paths, modules)
+
+            importer.invalidate_caches()
+            start = time.time()
+            local = sum(1 for m in objects if imp.is_local(m))
+            cold = time.time() - start
+
+            warm = None
+            for __ in xrange(repeat):
+                start = time.time()
+                for m in objects:
+                    imp.is_local(m)
+                delta = time.time() - start
+                if warm is None or delta < warm:
+                    warm = delta
+        finally:
+            shutil.rmtree(root)
+
+        results.append({
+            'paths': paths,
+            'modules': modules,
+            'local': local,
+            'cold': cold,
+            'warm': warm,
+        })
+
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--configs', default='1:100,10:1000,100:5000',
+                        help='comma separated list of paths:modules pairs')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of warm runs, the best time is reported')
+    parser.add_argument('-o', '--output', help='write results to this file')
+    args = parser.parse_args(argv)
+
+    configs = []
+    for item in args.configs.split(','):
+        paths, modules = item.split(':')
+        configs.append((int(paths), int(modules)))
+
+    data = {
+        'benchmark': 'importer_is_local',
+        'python': platform.python_version(),
+        'repeat': args.repeat,
+        'results': run(configs, args.repeat),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(data, fp, indent=2, sort_keys=True)
+    else:
+        json.dump(data, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    main()
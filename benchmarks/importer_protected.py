@@ -0,0 +1,177 @@
+# coding: utf-8
+#
+# Copyright (c) 2012-2013, Niklas Rosenstein
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and
+# documentation are those of the authors and should not be interpreted
+# as representing official policies,  either expressed or implied, of
+# the FreeBSD Project.
+r"""
+benchmarks.importer_protected
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Measures importing a package with many submodules in a protected
+environment of :class:`c4dtools.importer.Importer`, in (thread) isolated
+mode, in isolated mode that keeps the modules in ``sys.modules`` until
+the environment is exited and with the legacy
+:class:`~c4dtools.importer.ProtectedEnvironment`. Before measuring, it
+checks that the modules are removed from ``sys.modules`` afterwards and
+that the modes keeping them there support
+:func:`importlib.import_module`.
+
+The modification times of the package are set back before measuring,
+directory listings are not cached for directories modified in the last
+two seconds (see :func:`c4dtools.importer.get_dir_listing`). Results are
+written as JSON to stdout or to the file passed with ``--output``.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import compileall
+import tempfile
+import platform
+import argparse
+import importlib
+
+from c4d_standin import install_c4d_standin
+install_c4d_standin()
+
+from c4dtools import importer
+
+MODES = {
+    'isolated': {},
+    'locked': {'thread_isolated': False},
+    'legacy': {'isolated': False},
+}
+
+def make_package(root, name, modules):
+    r"""
+    Creates the package *name* with *modules* submodules in *root*,
+    compiles it and sets the modification times one minute back.
+    """
+
+    dirname = os.path.join(root, name)
+    os.mkdir(dirname)
+    with open(os.path.join(dirname, '__init__.py'), 'w') as fp:
+        fp.write('\n')
+    for index in xrange(modules):
+        with open(os.path.join(dirname, 'mod%d.py' % index), 'w') as fp:
+            fp.write('VALUE = %d\n' % index)
+
+    # The bytecode records the modification time of the sources.
+    mtime = time.time() - 60
+    for filename in os.listdir(dirname):
+        os.utime(os.path.join(dirname, filename), (mtime, mtime))
+    compileall.compile_dir(dirname, quiet=True)
+    for path in (dirname, root):
+        os.utime(path, (mtime, mtime))
+
+def check(root, name):
+    r"""
+    Raises AssertionError if a module imported in a protected
+    environment is left in ``sys.modules``, is not returned again by a
+    second import or can not be found with
+    :func:`importlib.import_module` in the modes that keep it in
+    ``sys.modules``.
+    """
+
+    for mode in sorted(MODES):
+        imp = importer.Importer(**MODES[mode])
+        imp.add(root)
+        with imp.protected():
+            module = __import__(name + '.mod0', fromlist=['VALUE'])
+            assert module.VALUE == 0, mode
+            again = __import__(name + '.mod0', fromlist=['VALUE'])
+            assert again is module, mode
+            if mode != 'isolated':
+                assert importlib.import_module(name + '.mod0') is module
+        assert name not in sys.modules, mode
+        assert name + '.mod0' not in sys.modules, mode
+
+def import_all(imp, name, modules):
+    with imp.protected():
+        for index in xrange(modules):
+            __import__('%s.mod%d' % (name, index))
+
+def run(sizes, repeat):
+    results = []
+    for modules in sizes:
+        root = tempfile.mkdtemp()
+        try:
+            name = 'benchpkg%d' % modules
+            make_package(root, name, modules)
+            check(root, name)
+
+            result = {'modules': modules}
+            for mode, options in sorted(MODES.items()):
+                best = None
+                for __ in xrange(repeat):
+                    imp = importer.Importer(store_modules=False, **options)
+                    imp.add(root)
+                    start = time.time()
+                    import_all(imp, name, modules)
+                    delta = time.time() - start
+                    if best is None or delta < best:
+                        best = delta
+                result[mode] = best
+        finally:
+            shutil.rmtree(root)
+
+        results.append(result)
+
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--sizes', default='10,100,1000',
+                        help='comma separated list of submodule counts')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs, the best time is reported')
+    parser.add_argument('-o', '--output', help='write results to this file')
+    args = parser.parse_args(argv)
+
+    sizes = [int(x) for x in args.sizes.split(',') if x.strip()]
+    data = {
+        'benchmark': 'importer_protected',
+        'python': platform.python_version(),
+        'repeat': args.repeat,
+        'results': run(sizes, args.repeat),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(data, fp, indent=2, sort_keys=True)
+    else:
+        json.dump(data, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+# coding: utf-8
+#
+# Copyright (c) 2012-2013, Niklas Rosenstein
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and
+# documentation are those of the authors and should not be interpreted
+# as representing official policies,  either expressed or implied, of
+# the FreeBSD Project.
+r"""
+benchmarks.menu_render
+~~~~~~~~~~~~~~~~~~~~~~
+
+Measures parsing, :meth:`~c4dtools.resource.menuparser.MenuNode.find_node`,
+validation and rendering of synthetic menus with 10 up to 100.000
+items. The menus are rendered to a :class:`RecordingDialog` that records
+the menu calls instead of creating a menu, and the strings are loaded
+from a :class:`SyntheticGeResource`. When the :mod:`c4d` module is not
+available (ie. outside of Cinema 4D), a minimal stand-in module is
+installed that provides just enough to import :mod:`c4dtools`. Only
+:func:`~c4dtools.resource.menuparser.parse_string` is used, so the
+benchmark runs without the third-party :mod:`scan` module.
+
+The results are written as JSON to stdout or to the file passed with
+``--output``:
+
+.. code-block:: none
+
+    python benchmarks/menu_render.py --sizes 10,1000,100000 -o bench.json
+"""
+
+import sys
+import json
+import time
+import platform
+import argparse
+
+from c4d_standin import install_c4d_standin
+install_c4d_standin()
+
+import c4d
+from c4dtools.resource import Resource
+from c4dtools.resource import menuparser
+
+class RecordingDialog(c4d.gui.GeDialog):
+    r"""
+    Stand-in for a :class:`c4d.gui.GeDialog` that records the menu calls
+    as tuples of ``(method_name, args...)`` in :attr:`calls`.
+    """
+
+    def __init__(self):
+        super(RecordingDialog, self).__init__()
+        self.calls = []
+
+    def MenuFlushAll(self):
+        self.calls.append(('MenuFlushAll',))
+
+    def MenuSubBegin(self, string):
+        self.calls.append(('MenuSubBegin', string))
+
+    def MenuSubEnd(self):
+        self.calls.append(('MenuSubEnd',))
+
+    def MenuAddString(self, id, string):
+        self.calls.append(('MenuAddString', id, string))
+
+    def MenuAddCommand(self, id):
+        self.calls.append(('MenuAddCommand', id))
+
+    def MenuAddSeparator(self):
+        self.calls.append(('MenuAddSeparator',))
+
+    def MenuFinished(self):
+        self.calls.append(('MenuFinished',))
+
+class SyntheticGeResource(c4d.plugins.GeResource):
+    r"""
+    Stand-in for a :class:`c4d.plugins.GeResource` returning a string
+    generated from the requested id.
+    """
+
+    def LoadString(self, id):
+        return 'String %d' % id
+
+def make_menu(count, fanout=10, max_depth=6, first_id=10000):
+    r"""
+    Generates the source of a menu resource with *count* items. Every
+    *fanout* th item opens a sub-menu (up to *max_depth* levels) that
+    is closed after it received *fanout* items. The other items are
+    strings, commands and separators. Returns ``(source, symbols,
+    last_symbol)``.
+    """
+
+    symbols = {}
+    lines = []
+    last_symbol = None
+
+    # The number of items in each of the currently open menus.
+    counts = [0]
+
+    def new_symbol():
+        name = 'SYM_%d' % len(symbols)
+        symbols[name] = first_id + len(symbols)
+        return name
+
+    lines.append('MENU %s {' % new_symbol())
+    for index in xrange(count):
+        indent = '    ' * len(counts)
+        counts[-1] += 1
+        if index % fanout == fanout - 1 and len(counts) < max_depth:
+            lines.append('%sMENU %s {' % (indent, new_symbol()))
+            counts.append(0)
+            continue
+        elif index % 7 == 3:
+            lines.append('%s-----;' % indent)
+        elif index % 5 == 2:
+            lines.append('%sCOMMAND %d;' % (indent, 5000 + index))
+        else:
+            last_symbol = new_symbol()
+            lines.append('%s%s;' % (indent, last_symbol))
+
+        while len(counts) > 1 and counts[-1] >= fanout:
+            counts.pop()
+            lines.append('    ' * len(counts) + '}')
+
+    while counts:
+        counts.pop()
+        lines.append('    ' * len(counts) + '}')
+
+    return '\n'.join(lines), symbols, last_symbol
+
+def measure(func, repeat):
+    r"""
+    Calls *func* *repeat* times and returns the best time in seconds
+    and the result of the last call.
+    """
+
+    best = None
+    result = None
+    for __ in xrange(repeat):
+        start = time.time()
+        result = func()
+        delta = time.time() - start
+        if best is None or delta < best:
+            best = delta
+    return best, result
+
+def run(sizes, repeat):
+    results = []
+    for count in sizes:
+        source, symbols, last_symbol = make_menu(count)
+        res = Resource(None, SyntheticGeResource(), symbols)
+        node_id = res.get(last_symbol)
+
+        t_parse, menu = measure(lambda: menuparser.parse_string(source),
+                                repeat)
+        t_find, node = measure(lambda: menu.find_node(node_id, res), repeat)
+        assert node is not None, 'find_node() did not find the last item'
+
+        def render():
+            dialog = RecordingDialog()
+            menu.render(dialog, res)
+            return dialog
+        t_render, dialog = measure(render, repeat)
+
+        t_validate, __ = measure(lambda: menu.validate(res), repeat)
+        t_render_validated, __ = measure(render, repeat)
+
+        results.append({
+            'items': count,
+            'bytes': len(source),
+            'symbols': len(symbols),
+            'calls': len(dialog.calls),
+            'parse': t_parse,
+            'find_node': t_find,
+            'render': t_render,
+            'validate': t_validate,
+            'render_validated': t_render_validated,
+        })
+
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--sizes', default='10,100,1000,10000,100000',
+                        help='comma separated list of menu item counts')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs, the best time is reported')
+    parser.add_argument('-o', '--output', help='write results to this file')
+    args = parser.parse_args(argv)
+
+    sizes = [int(x) for x in args.sizes.split(',') if x.strip()]
+    data = {
+        'benchmark': 'menu_render',
+        'python': platform.python_version(),
+        'repeat': args.repeat,
+        'results': run(sizes, args.repeat),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(data, fp, indent=2, sort_keys=True)
+    else:
+        json.dump(data, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    main()
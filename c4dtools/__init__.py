@@ -39,6 +39,10 @@ The ``c4dtools`` module is a thin Python library created by Niklas Rosenstein.
 It provides functions and classes for the everyday work with Python in
 Cinema 4D. The most significant feature is the cached parsing of dialog
 symbols, see :func:`c4dtools.prepare`.
+
+*Changed in 1.3.2*: The submodules are imported on the first access of
+the attribute with the same name (eg. ``c4dtools.utils``), importing
+``c4dtools`` only loads what :func:`prepare` needs when it is called.
 """
 
 __version__ = (1, 3, 1)
@@ -47,15 +51,103 @@ __author__ = {'name': 'Niklas Rosenstein',
 
 import os
 import sys
+import imp
 import c4d
 import glob
+import types
+import time
+import threading
+
+# Process-wide cache of the results of prepare() by the resolved
+# folders and the options.
+_prepare_cache = {}
+_prepare_lock = threading.Lock()
+
+class _LazyModule(types.ModuleType):
+    r"""
+    Private. Replaces a module in ``sys.modules`` to load some of its
+    attributes on first access, see :func:`_make_lazy`.
+    """
+
+    def __getattr__(self, name):
+        try:
+            modname, attr = self._lazy_attributes[name]
+        except KeyError:
+            raise AttributeError("'module' object has no attribute %r"
+                                 % name)
+
+        value = _import_submodule(self._lazy_package, modname)
+        if attr:
+            value = getattr(value, attr)
+        setattr(self, name, value)
+        return value
+
+def _make_lazy(module, attributes):
+    r"""
+    Private. Replaces *module* in ``sys.modules`` with a copy that loads
+    the *attributes* on first access and returns the copy. *attributes*
+    maps the attribute names to tuples of ``(modname, attr)``, *attr*
+    being None if the attribute is the module *modname* itself. The
+    original *module* is kept alive as the functions defined in it use
+    its dictionary as globals.
+    """
 
-from c4dtools import utils, resource, helpers, plugins, library, importer
-from c4dtools.library import load_library
+    lazy = _LazyModule(module.__name__)
+    lazy.__dict__.update(module.__dict__)
+    lazy._lazy_attributes = attributes
+    lazy._lazy_original = module
+    lazy._lazy_package = sys.modules[module.__name__.partition('.')[0]]
+    if lazy._lazy_package is module:
+        lazy._lazy_package = lazy
+    sys.modules[module.__name__] = lazy
+    return lazy
+
+def _import_submodule(package, modname):
+    r"""
+    Private. Imports the module *modname* from the *package* module and
+    returns it. When the package has been imported by an
+    :class:`~c4dtools.importer.Importer` and is not in ``sys.modules``,
+    it is put there with its loaded submodules for the import and the
+    imported modules are removed afterwards.
+    """
+
+    prefix = package.__name__ + '.'
+    imp.acquire_lock()
+    try:
+        if sys.modules.get(package.__name__) is package:
+            return __import__(modname, {}, {}, ['__name__'])
+
+        installed = {package.__name__: package}
+        pending = [package]
+        while pending:
+            for value in vars(pending.pop()).values():
+                if isinstance(value, types.ModuleType) and \
+                        value.__name__.startswith(prefix) and \
+                        value.__name__ not in installed:
+                    installed[value.__name__] = value
+                    pending.append(value)
+
+        saved = dict((name, sys.modules[name]) for name in installed
+                     if name in sys.modules)
+        before = set(sys.modules)
+        sys.modules.update(installed)
+        try:
+            return __import__(modname, {}, {}, ['__name__'])
+        finally:
+            for name in set(sys.modules) - before:
+                if name.startswith(prefix):
+                    del sys.modules[name]
+            for name in installed:
+                sys.modules.pop(name, None)
+            sys.modules.update(saved)
+    finally:
+        imp.release_lock()
 
 def prepare(filename=None, c4dres=None, cache=True,
             libfolder_name='lib', resfolder_name='res',
-            parse_description=False, imp_store_modules=True):
+            parse_description=False, imp_store_modules=True,
+            imp_share_modules=False, imp_preload=False, reuse=False,
+            background=False):
     r"""
     Call this function from a Cinema 4D python plugin-file (``*.pyp``) to
     set up convenient data that can be used from the plugin.
@@ -98,6 +190,12 @@ def prepare(filename=None, c4dres=None, cache=True,
         stored. The returned Importer instance will be able to load
         python modules and packages from this directory.
 
+        *New in 1.3.2*: If the folder does not exist but a bundle with
+        the same name and a ``.zip`` suffix does, the bundle is used.
+        See :func:`c4dtools.importer.build_bundle`. If the folder is
+        not writable, the Importer's ``bytecode_cache`` is set to the
+        per-user cache directory.
+
     :param resfolder_name:
 
         The name of the plugins resource folder. This usually does
@@ -116,6 +214,44 @@ def prepare(filename=None, c4dres=None, cache=True,
         Passed to the constructor of the returned :class:`Importer`,
         defining whether imported modules are stored or not.
 
+    :param imp_share_modules:
+
+        *New in 1.3.2*. Passed to the constructor of the returned
+        :class:`Importer`. When True, libraries that are byte-identical
+        to the ones of other plugins using this option are loaded once
+        and shared, see :attr:`c4dtools.importer.Importer.share_modules`.
+
+    :param imp_preload:
+
+        *New in 1.3.2*. When True, the modules imported from the library
+        folder are recorded in a file next to it (the folder name with an
+        ``.imports.json`` suffix). On the following starts, the recorded
+        modules are read and compiled by the worker threads of
+        :mod:`c4dtools.startup` so they are ready when the plugin imports
+        them. See :meth:`c4dtools.importer.Importer.preload`.
+
+    :param reuse:
+
+        *New in 1.3.2*. False by default. When True, the result is
+        cached process-wide by the plugin folder, the resource and
+        library folders and the options, and calling the function again
+        with *reuse* (eg. from another ``*.pyp`` file of the plugin or
+        when the plugin is reloaded) returns the same objects. Changes
+        to them, eg. adding a path to the Importer, affect all callers.
+        The Resource is bound to the *c4dres* of the latest call that
+        passed one. The cached result is not used when a symbols header
+        has been modified, the library folder has been replaced by a
+        bundle or vice versa, or a module stored in the Importer has been
+        modified since the first call. See :func:`clear_prepare_cache`.
+
+    :param background:
+
+        *New in 1.3.2*. False by default. When True, the function
+        returns without waiting for the symbols, the returned Resource
+        waits for them when they are accessed first and raises the
+        errors of loading them at that point, see
+        :meth:`c4dtools.resource.Resource.wait`.
+
     :return:
 
         A tuple of two elements:
@@ -124,8 +260,18 @@ def prepare(filename=None, c4dres=None, cache=True,
         - :class:`c4dtools.utils.Importer`
 
     *New in 1.3.0*: Added *imp_store_modules* parameter.
+
+    *Changed in 1.3.2*: The symbols are loaded by a worker thread of
+    :mod:`c4dtools.startup` while the Importer is set up, see
+    :meth:`c4dtools.resource.Resource.from_resource_folder`.
     """
 
+    # The submodules are not in the globals of this function, see
+    # _make_lazy().
+    utils, helpers = _package.utils, _package.helpers
+    resource, importer = _package.resource, _package.importer
+    tracing = _package.tracing
+
     globals_ = sys._getframe().f_back.f_globals
     if filename is None:
         filename = globals_.get('__file__', None)
@@ -138,21 +284,142 @@ def prepare(filename=None, c4dres=None, cache=True,
     utils.ensure_type(filename, basestring, name='filename')
     utils.ensure_type(c4dres, c4d.plugins.GeResource, type(None), name='c4dres')
 
-    path = helpers.Attributor()
-    path.root = os.path.dirname(filename)
-    path.res = resfolder_name
-    path.lib = libfolder_name
+    plugin = tracing.get_plugin_name(filename)
+    with tracing.span('prepare', plugin=plugin, filename=filename) as span:
+        path = helpers.Attributor()
+        path.root = os.path.dirname(filename)
+        path.res = resfolder_name
+        path.lib = libfolder_name
+
+        if not os.path.isabs(path.res):
+            path.res = os.path.join(path.root, path.res)
+        if not os.path.isabs(path.lib):
+            path.lib = os.path.join(path.root, path.lib)
+
+        if reuse:
+            key = (os.path.realpath(path.root), os.path.realpath(path.res),
+                   os.path.realpath(path.lib), cache, parse_description,
+                   imp_store_modules, imp_share_modules, imp_preload)
+            fingerprint = _get_prepare_fingerprint(path, parse_description)
+            result = _get_cached_prepare(key, fingerprint)
+            span.set(cached=result is not None)
+            if result is not None:
+                # The GeResource is not part of the key, the first call
+                # may have come from a module without `__res__` and a
+                # reloaded plugin gets a new one.
+                if c4dres is not None:
+                    result[0].c4dres = c4dres
+                if not background:
+                    result[0].wait()
+                return result
+
+        tracing.begin_plugin(plugin, filename=filename)
+
+        # The symbols are loaded by a worker thread while the Importer
+        # is set up (and the plugin continues with `background`), see
+        # c4dtools.startup.
+        res = resource.Resource.from_resource_folder(
+                path.res, c4dres, cache, parse_description,
+                background=True, plugin=plugin)
+
+        with tracing.span('Importer setup', plugin=plugin, lib=path.lib):
+            imp = importer.Importer(store_modules=imp_store_modules,
+                                    share_modules=imp_share_modules)
+            if os.path.isdir(path.lib):
+                imp.add(path.lib)
+
+                # Python can not write the bytecode next to the sources.
+                if not os.access(path.lib, os.W_OK):
+                    imp.bytecode_cache = importer.get_bytecode_cache_dir()
+
+                if imp_preload:
+                    imp.trace_file = path.lib + '.imports.json'
+                    imp.preload(plugin=plugin)
+            elif os.path.isfile(path.lib + '.zip'):
+                imp.add(path.lib + '.zip')
+
+        if not background:
+            res.wait()
+
+        if reuse:
+            with _prepare_lock:
+                _prepare_cache[key] = (fingerprint, time.time(), (res, imp))
 
-    if not os.path.isabs(path.res):
-        path.res = os.path.join(path.root, path.res)
-    if not os.path.isabs(path.lib):
-        path.lib = os.path.join(path.root, path.lib)
+    return (res, imp)
 
-    imp = importer.Importer(store_modules=imp_store_modules)
-    if os.path.isdir(path.lib):
-        imp.add(path.lib)
+def _get_prepare_fingerprint(path, parse_description):
+    r"""
+    Private. Returns the modification times and sizes of the symbol
+    headers in the resource folder and whether the library folder and
+    the bundle exist.
+    """
 
-    res = resource.Resource.from_resource_folder(path.res, c4dres, cache,
-                                                 parse_description)
-    return (res, imp)
+    headers = [os.path.join(path.res, 'c4d_symbols.h')]
+    if parse_description:
+        headers.extend(sorted(glob.glob(os.path.join(path.res,
+                                                     'description', '*.h'))))
+
+    result = []
+    for filename in headers:
+        try:
+            st = os.stat(filename)
+        except OSError:
+            result.append((filename, None))
+        else:
+            result.append((filename, st.st_mtime, st.st_size))
+
+    result.append(os.path.isdir(path.lib))
+    result.append(os.path.isfile(path.lib + '.zip'))
+    return result
+
+def _get_cached_prepare(key, fingerprint):
+    r"""
+    Private. Returns the cached result of :func:`prepare` for *key* or
+    None if there is none or it is outdated.
+    """
+
+    with _prepare_lock:
+        entry = _prepare_cache.get(key)
+    if entry is None or entry[0] != fingerprint:
+        return None
+
+    # Modules that have been modified after the first call would not
+    # be loaded again by the cached Importer.
+    created, result = entry[1:]
+    for module in (result[1].modules or {}).values():
+        filename = getattr(module, '__file__', None)
+        if not filename:
+            continue
+        if os.path.splitext(filename)[1] in ('.pyc', '.pyo'):
+            filename = filename[:-1]
+        try:
+            if os.path.getmtime(filename) > created:
+                return None
+        except OSError:
+            pass
+
+    return result
+
+def clear_prepare_cache():
+    r"""
+    *New in 1.3.2*. Clears the cached results of :func:`prepare`.
+    """
 
+    with _prepare_lock:
+        _prepare_cache.clear()
+
+_package = _make_lazy(sys.modules[__name__], {
+    'utils': ('c4dtools.utils', None),
+    'resource': ('c4dtools.resource', None),
+    'helpers': ('c4dtools.helpers', None),
+    'plugins': ('c4dtools.plugins', None),
+    'library': ('c4dtools.library', None),
+    'importer': ('c4dtools.importer', None),
+    'math': ('c4dtools.math', None),
+    'decorators': ('c4dtools.decorators', None),
+    'tracing': ('c4dtools.tracing', None),
+    'startup': ('c4dtools.startup', None),
+
+    # Backwards compatibility.
+    'load_library': ('c4dtools.library', 'load_library'),
+})
@@ -41,7 +41,185 @@ contents of this package was previously defined in :mod`c4dtools.utils`.
 
 import os
 import sys
+import imp
+import types
 import copy
+import json
+import time
+import timeit
+import struct
+import hashlib
+import marshal
+import zipfile
+import warnings
+import thread
+import threading
+
+from c4dtools import tracing
+from c4dtools import startup
+
+try:
+    import cStringIO as StringIO
+except ImportError:
+    import StringIO
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Process-wide caches of is_package_dir() and get_root_module(). The
+# entries are validated with the modification time of the directories
+# they depend on and with the listings of get_dir_listing().
+_package_cache = {}
+_root_cache = {}
+
+# Process-wide cache of the normalized real paths of directories.
+_realpath_cache = {}
+
+# Process-wide cache of directory listings, validated with the
+# modification time of the directories at most once per generation, see
+# get_dir_listing(). The entries are tuples of the modification time,
+# the listing and the generation they have been validated in.
+_listing_cache = {}
+_listing_generation = 0
+
+# The suffixes of the module files for the running interpreter.
+_module_suffixes = [sufx for sufx, mode, type_ in imp.get_suffixes()]
+
+# Process-wide caches of the loaded bundles by their filename and the
+# BundleImporter (or None) for search-path entries.
+_bundle_cache = {}
+_bundle_importers = {}
+
+# Process-wide store of the module trees shared by Importers with
+# `share_modules` enabled by (root name, content hash), and the cached
+# content hashes of module files and package directories.
+_shared_store = {}
+_shared_lock = threading.Lock()
+_content_hash_cache = {}
+
+# Serializes the ProtectedEnvironments of all threads and the
+# IsolatedEnvironments that are not thread isolated.
+_protected_lock = threading.RLock()
+
+# The encoding of filenames, used for the saved import traces.
+_fs_encoding = sys.getfilesystemencoding() or 'utf-8'
+
+# The suffix of bytecode files for the running interpreter.
+_bytecode_suffix = '.pyc' if __debug__ else '.pyo'
+
+def _get_mtime(dirname):
+    try:
+        return os.stat(dirname or os.curdir).st_mtime
+    except OSError:
+        return None
+
+def _get_realpath(path):
+    result = _realpath_cache.get(path)
+    if result is None:
+        result = os.path.normcase(os.path.realpath(path))
+        _realpath_cache[path] = result
+    return result
+
+def is_package_dir(dirname, suffixes='pyc pyo py'.split(), mtime=None):
+    r"""
+    *New in 1.3.2*. Returns True if the directory *dirname* contains an
+    ``__init__`` file with one of the passed *suffixes*. The result is
+    cached until the modification time of the directory changes. The
+    modification time can be passed with *mtime* if it is already
+    known.
+    """
+
+    if mtime is None:
+        mtime = _get_mtime(dirname)
+    if mtime is None:
+        return False
+
+    key = (dirname, tuple(suffixes))
+    entry = _package_cache.get(key)
+    if entry and entry[0] == mtime:
+        return entry[1]
+
+    result = False
+    for sufx in suffixes:
+        init_mod = os.path.join(dirname, '__init__.%s' % sufx)
+        if os.path.exists(init_mod):
+            result = True
+            break
+
+    _package_cache[key] = (mtime, result)
+    return result
+
+def get_dir_listing(dirname):
+    r"""
+    *New in 1.3.2*. Returns a frozenset of the names in the directory
+    *dirname* or None if it is not a directory. The listing is cached
+    until the modification time of the directory changes. Directories
+    that have been modified in the last two seconds are listed again in
+    the next generation as the resolution of the modification time can
+    be too coarse to see further changes.
+
+    The modification time of a cached listing is checked only once per
+    generation. A new generation is started by every
+    :class:`IsolatedEnvironment` and :class:`ProtectedEnvironment` that
+    is entered, so the directories are checked once per environment
+    (ie. once per :meth:`Importer.import_`) instead of once per module
+    lookup. Missing directories are cached the same way. Use
+    :func:`invalidate_caches` if a directory changes while an
+    environment is active.
+    """
+
+    generation = _listing_generation
+    entry = _listing_cache.get(dirname)
+    if entry and entry[2] == generation:
+        return entry[1]
+
+    mtime = _get_mtime(dirname)
+    if mtime is None:
+        _listing_cache[dirname] = (None, None, generation)
+        return None
+
+    if entry and entry[0] == mtime:
+        _listing_cache[dirname] = (mtime, entry[1], generation)
+        return entry[1]
+
+    try:
+        names = frozenset(os.listdir(dirname or os.curdir))
+    except OSError:
+        return None
+
+    # Recently modified directories are listed again in the next
+    # generation.
+    if time.time() - mtime < 2:
+        mtime = None
+    _listing_cache[dirname] = (mtime, names, generation)
+    return names
+
+def _next_listing_generation():
+    r"""
+    Private. Starts a new generation of :func:`get_dir_listing`, the
+    cached listings are validated again when they are used next.
+    """
+
+    global _listing_generation
+    _listing_generation += 1
+
+def _may_contain(dirname, name):
+    r"""
+    Private. Returns False if the directory *dirname* does certainly not
+    contain the module or package *name*, using :func:`get_dir_listing`.
+    """
+
+    names = get_dir_listing(dirname)
+    if names is None:
+        return False
+    if name in names:
+        return True
+    for sufx in _module_suffixes:
+        if name + sufx in names:
+            return True
+    return False
 
 def get_root_module(modname, suffixes='pyc pyo py'.split()):
     r"""
@@ -51,24 +229,113 @@ def get_root_module(modname, suffixes='pyc pyo py'.split()):
     is a tuple of ``(root_path, is_file)``.
 
     *New in 1.3.0*: Moved to :mod:`c4dtools.importer`.
+
+    *Changed in 1.3.2*: The results are cached process-wide and are
+    validated with the listings of the directories that have been
+    checked, see :func:`get_dir_listing` and :func:`invalidate_caches`.
     """
 
-    dirname, basename = os.path.split(modname)
+    key = (modname, tuple(suffixes))
+    entry = _root_cache.get(key)
+    if entry:
+        listings, result = entry
+        for dirname, names in listings:
+            current = get_dir_listing(dirname)
+            if current is not names and current != names:
+                break
+        else:
+            return result
 
-    # Check if the module-filename is part of a Python package.
-    in_package =  False
-    for sufx in suffixes:
-        init_mod = os.path.join(dirname, '__init__.%s' % sufx)
-        if os.path.exists(init_mod):
-            in_package = True
+    # Go up the directories as long as they are Python packages.
+    init_names = ['__init__.' + sufx for sufx in suffixes]
+    listings = []
+    path = modname
+    while True:
+        dirname = os.path.dirname(path)
+        names = get_dir_listing(dirname)
+        listings.append((dirname, names))
+        if dirname == path or not names or \
+                not any(x in names for x in init_names):
             break
+        path = dirname
+
+    result = os.path.normpath(path), os.path.isfile(path)
+    _root_cache[key] = (listings, result)
+    return result
+
+def invalidate_caches():
+    r"""
+    *New in 1.3.2*. Clears the process-wide caches of
+    :func:`get_root_module` and :func:`is_package_dir`, the cached
+    real paths used by :meth:`Importer.is_local`, the directory listings
+    of :func:`get_dir_listing` and the loaded bundles, see
+    :func:`get_bundle_importer`. The content hashes of
+    :func:`get_content_hash` and the modules shared by Importers with
+    :attr:`~Importer.share_modules` are dropped as well, Importers
+    created afterwards will execute their modules again.
+    """
+
+    _package_cache.clear()
+    _root_cache.clear()
+    _realpath_cache.clear()
+    _listing_cache.clear()
+    _bundle_cache.clear()
+    _bundle_importers.clear()
+    _content_hash_cache.clear()
+    with _shared_lock:
+        _shared_store.clear()
+
+def _update_hash(digest, name, data):
+    digest.update('%s\0%d\0' % (name, len(data)))
+    digest.update(data)
+
+def _skip_bytecode(name, names):
+    r"""
+    Private. Returns True if *name* is a bytecode file and the source
+    file is in *names*.
+    """
+
+    base, sufx = os.path.splitext(name)
+    return sufx in ('.pyc', '.pyo') and base + '.py' in names
+
+def get_content_hash(path):
+    r"""
+    *New in 1.3.2*. Returns a hash of the contents of the module file or
+    package directory *path* as hexadecimal string. For a package, the
+    names and contents of all files in the directory tree are hashed,
+    bytecode files are skipped if their source file exists. The result
+    is cached process-wide and validated with the modification time of
+    *path*, changes in the subdirectories of a package require to call
+    :func:`invalidate_caches`.
+    """
+
+    mtime = _get_mtime(path)
+    entry = _content_hash_cache.get(path)
+    if entry and entry[0] == mtime:
+        return entry[1]
 
-    # Go on recursively if the module is in a package or return the
-    # module path and if it is a file.
-    if in_package:
-        return get_root_module(dirname)
+    digest = hashlib.sha1()
+    basename = os.path.basename(path)
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            relroot = os.path.relpath(root, path)
+            names = set(files)
+            for name in sorted(files):
+                if _skip_bytecode(name, names):
+                    continue
+                member = os.path.normpath(os.path.join(basename, relroot,
+                                                       name))
+                with open(os.path.join(root, name), 'rb') as fp:
+                    _update_hash(digest, member.replace(os.sep, '/'),
+                                 fp.read())
     else:
-        return os.path.normpath(modname), os.path.isfile(modname)
+        with open(path, 'rb') as fp:
+            _update_hash(digest, basename, fp.read())
+
+    result = digest.hexdigest()
+    _content_hash_cache[path] = (mtime, result)
+    return result
 
 class Importer(object):
     r"""
@@ -93,6 +360,72 @@ class Importer(object):
         with the instance of the :class:`Importer`. Can be ``None``
         when *store_modules* was passed ``False`` on initialization.
 
+    .. attribute:: profiler
+
+        *New in 1.3.2*. An :class:`ImportProfiler` that records the
+        modules imported in isolated mode, or None. Created when
+        *profile* is passed True. The :class:`ProtectedEnvironment`
+        (:attr:`isolated` False) leaves the imports to Python's default
+        import mechanism and does not record them.
+
+    .. attribute:: bytecode_cache
+
+        *New in 1.3.2*. A directory to read and write the bytecode of
+        source modules in isolated mode instead of next to the source
+        files, or None. Passing True on construction uses the per-user
+        directory returned by :func:`get_bytecode_cache_dir`. See
+        :func:`load_cached_code`.
+
+    .. attribute:: share_modules
+
+        *New in 1.3.2*. When True, the top-level modules and packages
+        imported in isolated mode are shared with other Importers that
+        have this option enabled. A module (including its submodules)
+        is executed once and served to every Importer that finds a
+        module with the same name and the same content hash (see
+        :func:`get_content_hash`), so a library shipped byte-identical
+        with multiple plugins is only loaded once. Different versions of
+        a library stay isolated.
+
+        The other modules of the Importer that the shared modules
+        reference (found by their globals) must have the same content,
+        too, otherwise the module is executed again. Only modules from
+        imports that completed without an exception are shared, and
+        they must not be modified by the plugins.
+
+    .. attribute:: trace
+
+        *New in 1.3.2*. A list of ``(name, filename)`` tuples of the
+        modules that have been loaded in isolated mode, in the order
+        their imports started. *filename* is None for modules without a
+        file. See :meth:`save_trace` and :meth:`preload`.
+
+    .. attribute:: trace_file
+
+        *New in 1.3.2*. A filename or None. When set, the :attr:`trace`
+        is saved to this file when a protected environment is exited and
+        the trace has changed since the last save.
+
+    .. attribute:: isolated
+
+        *New in 1.3.2*. When True (default), :meth:`protected` returns
+        an :class:`IsolatedEnvironment` that resolves the modules from
+        the importer's paths with a ``sys.meta_path`` finder. When False,
+        the :class:`ProtectedEnvironment` is used that modifies
+        ``sys.path`` and restores ``sys.modules`` from a snapshot.
+
+    .. attribute:: thread_isolated
+
+        *New in 1.3.2*. When True (default), the modules of an
+        :class:`IsolatedEnvironment` are only in ``sys.modules`` while
+        they are loaded and other threads can import and use their own
+        environments at the same time. Code looking up the imported
+        modules in ``sys.modules`` after the import (eg.
+        :func:`importlib.import_module` or :mod:`pickle`) does not work
+        in such an environment. When False, the modules stay in
+        ``sys.modules`` until the environment is exited and the
+        environments of all threads are executed one after another.
+
     *New in 1.3.0*:
 
         - Moved to :mod:`c4dtools.importer`
@@ -100,11 +433,42 @@ class Importer(object):
     """
 
     def __init__(self, high_priority=False, use_sys_path=True,
-                 store_modules=True):
+                 store_modules=True, isolated=True, profile=False,
+                 bytecode_cache=None, share_modules=False,
+                 trace_file=None, thread_isolated=True):
         super(Importer, self).__init__()
         self.path = []
         self.use_sys_path = use_sys_path
         self.high_priority = high_priority
+        self.isolated = isolated
+        self.thread_isolated = thread_isolated
+        self.share_modules = share_modules
+        self.profiler = ImportProfiler() if profile else None
+
+        if bytecode_cache is True:
+            bytecode_cache = get_bytecode_cache_dir()
+        self.bytecode_cache = bytecode_cache
+
+        # A copy of `path` and the set of normalized and real paths
+        # of its entries, see `_get_path_index()`.
+        self._path_index = None
+
+        # Content hashes of the top-level modules resolved from our
+        # paths when `share_modules` is enabled.
+        self._root_hashes = {}
+
+        self.trace = []
+        self.trace_file = trace_file
+        self._saved_trace = None
+
+        # Code objects compiled by `preload()` by the source filename,
+        # with the modification time and size of the file. While a
+        # preload is running, the files looked up by imports are added
+        # to `_claimed` and are not preloaded anymore.
+        self._preloaded = {}
+        self._preloading = 0
+        self._claimed = set()
+        self._preload_lock = threading.Lock()
 
         if store_modules:
             self.modules = {}
@@ -116,6 +480,9 @@ class Importer(object):
         Add the passed strings to the search-path for importing
         modules. Raises TypeError if non-string object was passed.
         Passed paths are automatically expanded.
+
+        *New in 1.3.2*: A path may point to a bundle created with
+        :func:`build_bundle`.
         """
 
         new_paths = []
@@ -127,25 +494,64 @@ class Importer(object):
 
         self.path.extend(new_paths)
 
+    def _get_path_index(self):
+        r"""
+        Private. Returns a set of the normalized paths and real paths of
+        the importer's search-paths. The set is rebuilt when :attr:`path`
+        has been changed.
+        """
+
+        index = self._path_index
+        if index is None or index[0] != self.path:
+            names = set()
+            for path in self.path:
+                names.add(os.path.normcase(path))
+                names.add(_get_realpath(path))
+            index = self._path_index = (list(self.path), frozenset(names))
+        return index[1]
+
     def is_local(self, module):
         r"""
         Returns True if the passed module object can be found in the
         paths defined in the importer, False if not.
+
+        *Changed in 1.3.2*: The search-paths are compared by set lookup
+        and symbolic links are resolved. The real paths are cached, see
+        :func:`invalidate_caches`.
         """
 
-        if not hasattr(module, '__file__'):
+        filename = getattr(module, '__file__', None)
+        if not filename:
             return False
 
-        modpath = os.path.dirname(get_root_module(module.__file__)[0])
-        return modpath in self.path
+        # Modules from a bundle or zip-file are local if the archive
+        # is one of the search-paths.
+        archive = getattr(getattr(module, '__loader__', None), 'archive', None)
+        if archive:
+            index = self._get_path_index()
+            if os.path.normcase(archive) in index:
+                return True
+            return _get_realpath(archive) in index
+
+        modpath = os.path.dirname(get_root_module(filename)[0])
+        index = self._get_path_index()
+        if os.path.normcase(modpath) in index:
+            return True
+        return _get_realpath(modpath) in index
 
-    def import_(self, name):
+    def import_(self, name, lazy=False):
         r"""
         Import the module with the given name from the directories
         added to the Importer. The loaded module will not be inserted
         into `sys.modules`.
+
+        *New in 1.3.2*: If *lazy* is True, a :class:`LazyModule` is
+        returned that imports the module on the first attribute access.
         """
 
+        if lazy:
+            return LazyModule(self, name)
+
         with self.protected():
             m = __import__(name)
             for n in name.split('.')[1:]:
@@ -163,10 +569,178 @@ class Importer(object):
             with imp.protected():
                 import module_a
                 import module_b
+
+        *Changed in 1.3.2*: Returns an :class:`IsolatedEnvironment` if
+        :attr:`isolated` is True. Protected environments can be used
+        from multiple threads, they are executed one after another
+        unless they are :attr:`thread_isolated`.
         """
 
+        if self.isolated:
+            return IsolatedEnvironment(self)
         return ProtectedEnvironment(self)
 
+    def save_trace(self, filename=None):
+        r"""
+        *New in 1.3.2*. Saves the :attr:`trace` as JSON to *filename*,
+        defaulting to :attr:`trace_file`. Returns True on success, errors
+        writing the file are silently ignored.
+        """
+
+        if filename is None:
+            filename = self.trace_file
+        trace = list(self.trace)
+        data = {
+            'python': sys.version,
+            'modules': [{'name': name, 'filename': modfile}
+                        for name, modfile in trace],
+        }
+
+        temp_name = '%s.%d.tmp' % (filename, os.getpid())
+        try:
+            with open(temp_name, 'w') as fp:
+                json.dump(data, fp, indent=2, encoding=_fs_encoding)
+            if os.path.exists(filename):
+                os.remove(filename)
+            os.rename(temp_name, filename)
+        except (IOError, OSError):
+            try:
+                os.remove(temp_name)
+            except OSError:
+                pass
+            return False
+
+        if filename == self.trace_file:
+            self._saved_trace = trace
+        return True
+
+    def preload(self, filename=None, background=True, plugin=None):
+        r"""
+        *New in 1.3.2*. Reads and compiles the source files of the
+        modules in the trace *filename* (defaulting to :attr:`trace_file`)
+        that has been saved by a previous run, see :meth:`save_trace`.
+        The modules are not executed, their code objects are kept until
+        they are imported through the Importer in isolated mode. Code of
+        files that have been modified in the meantime is not used.
+
+        With *background* True, the files are processed by a worker
+        thread of :mod:`c4dtools.startup` and the
+        :class:`~c4dtools.startup.Task` is returned (submitted for the
+        *plugin* name). Otherwise None is returned after all files have
+        been processed. The :attr:`bytecode_cache` is used if it is set.
+        """
+
+        if filename is None:
+            filename = self.trace_file
+        trace = load_trace(filename)
+        if filename == self.trace_file:
+            self._saved_trace = trace
+
+        # Counted before the worker starts, imports claim their files
+        # from now on (see `_claim_preloaded()`).
+        with self._preload_lock:
+            self._preloading += 1
+
+        if not background:
+            self._preload(trace)
+            return None
+
+        return startup.submit(self._preload, args=(trace,),
+                              name='preload modules', plugin=plugin)
+
+    def _preload(self, trace):
+        r"""
+        Private. Loads the code of the source files in *trace*. Modules
+        that have been imported already and files that an import looked
+        up in the meantime are skipped, their code would never be taken.
+        """
+
+        try:
+            for name, modfile in trace:
+                if not modfile or os.path.splitext(modfile)[1] not in \
+                        ('.py', '.pyc', '.pyo'):
+                    continue
+                modfile = os.path.splitext(modfile)[0] + '.py'
+                if modfile in self._preloaded or modfile in self._claimed:
+                    continue
+                if name in sys.modules or (self.modules is not None and
+                                           name in self.modules):
+                    continue
+
+                try:
+                    st = os.stat(modfile)
+                    if self.bytecode_cache:
+                        code = load_cached_code(modfile, self.bytecode_cache)
+                    else:
+                        code = load_code(modfile)
+                except Exception:
+                    # The error is reported when the module is imported.
+                    continue
+
+                with self._preload_lock:
+                    if modfile not in self._claimed:
+                        self._preloaded[modfile] = (st.st_mtime, st.st_size,
+                                                    code)
+        finally:
+            with self._preload_lock:
+                self._preloading -= 1
+                if not self._preloading:
+                    self._claimed.clear()
+
+    def _claim_preloaded(self, filename):
+        r"""
+        Private. Returns True if the code of the source file *filename*
+        has been preloaded. If a preload is running, the file is not
+        preloaded after this call.
+        """
+
+        with self._preload_lock:
+            if self._preloading:
+                self._claimed.add(filename)
+            return filename in self._preloaded
+
+    def _take_preloaded(self, filename):
+        r"""
+        Private. Returns and forgets the preloaded code of the source
+        file *filename* or None if it has not been preloaded or the file
+        has been modified since.
+        """
+
+        entry = self._preloaded.pop(filename, None)
+        if entry is None:
+            return None
+
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        if (st.st_mtime, st.st_size) != entry[:2]:
+            return None
+        return entry[2]
+
+    def _record_import(self, name):
+        r"""
+        Private. Adds a module that is being loaded in isolated mode to
+        the :attr:`trace` and returns its index. The filename is set when
+        the module has been loaded.
+        """
+
+        self.trace.append((name, None))
+        return len(self.trace) - 1
+
+    def _update_trace_file(self):
+        r"""
+        Private. Saves the :attr:`trace` to the :attr:`trace_file` if it
+        differs from the start of the saved trace.
+        """
+
+        if self._saved_trace is None:
+            self._saved_trace = load_trace(self.trace_file)
+        # Most of the time, the trace is a prefix of the saved trace
+        # while the plugin is starting up.
+        if self.trace != self._saved_trace[:len(self.trace)]:
+            self.save_trace()
+
     def _store_module(self, name, module):
         r"""
         Private. Stores a module in the dictionary modules dictionary
@@ -176,14 +750,350 @@ class Importer(object):
         if self.modules is not None:
             self.modules[name] = module
 
+class LazyModule(object):
+    r"""
+    *New in 1.3.2*. Proxy for a module that is imported with
+    :meth:`Importer.import_` on the first access of one of its attributes.
+    The import is done once even when the proxy is accessed from multiple
+    threads at the same time. Attributes are read from and written to
+    the imported module.
+
+    .. code-block:: python
+
+        mylib = imp.import_('mylib', lazy=True)
+
+        def on_execute():
+            # mylib is imported here on the first call.
+            mylib.do_stuff()
+    """
+
+    __slots__ = ('_importer', '_name', '_module', '_lock')
+
+    def __init__(self, importer, name):
+        object.__setattr__(self, '_importer', importer)
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_module', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return '<lazy module %r (%s)>' % (self._name, state)
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._resolve(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self._resolve(), name)
+
+    def __dir__(self):
+        return dir(self._resolve())
+
+    def _resolve(self):
+        r"""
+        Private. Returns the module, importing it if it was not already.
+        """
+
+        module = self._module
+        if module is None:
+            with self._lock:
+                module = self._module
+                if module is None:
+                    module = self._importer.import_(self._name)
+                    object.__setattr__(self, '_module', module)
+        return module
+
+def get_memory_usage():
+    r"""
+    *New in 1.3.2*. Returns the resident memory of the process in bytes
+    or None if it can not be determined. Uses :mod:`psutil` if it is
+    available, otherwise ``GetProcessMemoryInfo()`` on Windows,
+    ``/proc/self/statm`` on Linux and :func:`resource.getrusage` on
+    macOS. The latter only reports the peak resident memory, the
+    differences measured there only show how much the peak has grown.
+    """
+
+    if psutil:
+        return psutil.Process(os.getpid()).memory_info().rss
+    if sys.platform == 'win32':
+        return _get_memory_usage_windows()
+    if sys.platform == 'darwin':
+        return _get_memory_usage_darwin()
+
+    try:
+        with open('/proc/self/statm') as fp:
+            pages = int(fp.read().split()[1])
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+def _get_memory_usage_windows():
+    r"""
+    Private. Returns the working set size of the process in bytes.
+    """
+
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD),
+                    ('PageFaultCount', wintypes.DWORD)] + \
+                   [(name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize',
+                    'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage',
+                    'PagefileUsage', 'PeakPagefileUsage')]
+
+    try:
+        kernel32, psapi = ctypes.windll.kernel32, ctypes.windll.psapi
+    except (AttributeError, OSError):
+        return None
+
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(),
+                                      ctypes.byref(counters), counters.cb):
+        return None
+    return counters.WorkingSetSize
+
+def _get_memory_usage_darwin():
+    r"""
+    Private. Returns the peak resident memory of the process in bytes.
+    """
+
+    # `import resource` would find c4dtools.resource.
+    resource = __import__('resource', {}, {}, [], 0)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class ImportRecord(object):
+    r"""
+    *New in 1.3.2*. Information about a module import recorded by the
+    :class:`ImportProfiler`.
+
+    .. attribute:: name
+
+        The full name of the module.
+
+    .. attribute:: filename
+
+        The ``__file__`` of the module or None.
+
+    .. attribute:: parent
+
+        The record of the module that imported this module, or None.
+
+    .. attribute:: children
+
+        The records of the modules imported by this module.
+
+    .. attribute:: time
+
+        The time in seconds spent importing the module, excluding the
+        time of its children.
+
+    .. attribute:: cumulative
+
+        The time in seconds spent importing the module including its
+        children.
+
+    .. attribute:: memory
+
+        The change of the process' memory in bytes during the import
+        of the module including its children, or None.
+    """
+
+    def __init__(self, name, parent=None):
+        super(ImportRecord, self).__init__()
+        self.name = name
+        self.filename = None
+        self.parent = parent
+        self.children = []
+        self.time = 0.0
+        self.cumulative = 0.0
+        self.memory = None
+
+        # Timer and memory usage at the start of the import.
+        self._start = None
+        self._memory = None
+
+    def __repr__(self):
+        return '<ImportRecord %r %.6fs>' % (self.name, self.cumulative)
+
+    def to_dict(self):
+        r"""
+        Returns the record and its children as a dictionary.
+        """
+
+        return {
+            'name': self.name,
+            'filename': self.filename,
+            'time': self.time,
+            'cumulative': self.cumulative,
+            'memory': self.memory,
+            'children': [child.to_dict() for child in self.children],
+        }
+
+class ImportProfiler(object):
+    r"""
+    *New in 1.3.2*. Records the imports done through an
+    :class:`Importer` in isolated mode, see :attr:`Importer.profiler`.
+
+    .. code-block:: python
+
+        imp = c4dtools.importer.Importer(profile=True)
+        imp.add(lib_path)
+        with imp.protected():
+            import mylib
+
+        print imp.profiler.format_report(limit=10)
+        print imp.profiler.format_tree()
+
+    .. attribute:: records
+
+        A list of all :class:`ImportRecord` objects in the order the
+        imports were started.
+
+    .. attribute:: roots
+
+        A list of the records of the modules that were not imported by
+        another recorded module.
+    """
+
+    def __init__(self):
+        super(ImportProfiler, self).__init__()
+        self.records = []
+        self.roots = []
+        self._local = threading.local()
+
+    def _get_stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def begin(self, name):
+        r"""
+        Starts a new :class:`ImportRecord` for the module *name* and
+        returns it. Must be followed by a call to :meth:`end`.
+        """
+
+        stack = self._get_stack()
+        parent = stack[-1] if stack else None
+        record = ImportRecord(name, parent)
+        if parent:
+            parent.children.append(record)
+        else:
+            self.roots.append(record)
+        self.records.append(record)
+
+        stack.append(record)
+        record._memory = get_memory_usage()
+        record._start = timeit.default_timer()
+        return record
+
+    def end(self, record):
+        r"""
+        Finishes the *record* returned by :meth:`begin`.
+        """
+
+        record.cumulative = timeit.default_timer() - record._start
+        record.time = record.cumulative - sum(
+                child.cumulative for child in record.children)
+
+        memory = get_memory_usage()
+        if memory is not None and record._memory is not None:
+            record.memory = memory - record._memory
+
+        stack = self._get_stack()
+        if stack and stack[-1] is record:
+            stack.pop()
+
+    def clear(self):
+        r"""
+        Removes all records.
+        """
+
+        self.records = []
+        self.roots = []
+
+    def report(self, sort='cumulative'):
+        r"""
+        Returns the list of records sorted descending by the attribute
+        *sort* (``'cumulative'``, ``'time'`` or ``'memory'``).
+        """
+
+        return sorted(self.records, key=lambda r: getattr(r, sort),
+                      reverse=True)
+
+    def format_report(self, sort='cumulative', limit=None):
+        r"""
+        Returns the :meth:`report` as a table. *limit* is the maximum
+        number of records to include.
+        """
+
+        lines = ['%12s %12s %12s  %s' % ('cumulative', 'time', 'memory',
+                                         'name')]
+        for record in self.report(sort)[:limit]:
+            memory = '-' if record.memory is None else str(record.memory)
+            lines.append('%12.6f %12.6f %12s  %s' % (record.cumulative,
+                         record.time, memory, record.name))
+        return '\n'.join(lines)
+
+    def format_tree(self):
+        r"""
+        Returns the records as an indented tree of the modules and the
+        modules they imported.
+        """
+
+        lines = []
+        stack = [(record, 0) for record in reversed(self.roots)]
+        while stack:
+            record, depth = stack.pop()
+            lines.append('%s%s (%.6fs, self %.6fs)' % ('  ' * depth,
+                         record.name, record.cumulative, record.time))
+            stack.extend((child, depth + 1)
+                         for child in reversed(record.children))
+        return '\n'.join(lines)
+
+    def dump(self, filename):
+        r"""
+        Writes the records as a tree to the JSON file *filename*.
+        """
+
+        with open(filename, 'w') as fp:
+            json.dump([record.to_dict() for record in self.roots], fp,
+                      indent=2)
+
 class ProtectedEnvironment(object):
+    r"""
+    Protected environment that modifies ``sys.path`` and restores
+    ``sys.modules`` from a snapshot, see :meth:`Importer.protected`.
+
+    *Changed in 1.3.2*: The environment holds a process-wide lock while
+    it is active. Protected environments in multiple threads are executed
+    one after another instead of corrupting each other's state, use the
+    :class:`IsolatedEnvironment` to import concurrently. The imports are
+    not recorded by the :attr:`Importer.profiler`.
+    """
 
     def __init__(self, importer):
         super(ProtectedEnvironment, self).__init__()
         self.importer = importer
 
     def __enter__(self):
+        _protected_lock.acquire()
+        try:
+            self._enter()
+        except:
+            _protected_lock.release()
+            raise
+
+    def _enter(self):
         importer = self.importer
+        _next_listing_generation()
 
         # Store the previous path and module configuration.
         self.prev_path = copy.copy(sys.path)
@@ -204,6 +1114,12 @@ class ProtectedEnvironment(object):
         return None
 
     def __exit__(self, exc_type, exc_value, exc_tb):
+        try:
+            self._exit()
+        finally:
+            _protected_lock.release()
+
+    def _exit(self):
         importer = self.importer
 
         # Restore the previous `sys.path` configuration.
@@ -218,4 +1134,1191 @@ class ProtectedEnvironment(object):
             else:
                 sys.modules[k] = v
 
+class IsolatedEnvironment(object):
+    r"""
+    *New in 1.3.2*. Protected environment for an :class:`Importer` that
+    is implemented as a :pep:`302` finder in ``sys.meta_path`` instead of
+    modifying ``sys.path`` and taking a snapshot of ``sys.modules``.
+
+    The finder resolves top-level modules from the importer's paths and
+    submodules of the packages it has loaded. Modules stored in the
+    importer are served from its :attr:`Importer.modules`. It only
+    answers imports of the thread that entered the environment, so
+    environments of multiple threads can be active at the same time.
+
+    When the importer is :attr:`~Importer.thread_isolated` (default), a
+    module is only in ``sys.modules`` while it is loaded, together with
+    its parent packages (Python requires them there for relative
+    imports), and is taken out again when the outermost import of the
+    environment returns. Python holds the import lock until then, so
+    import statements of other threads never see the modules. Imports
+    of modules the environment has already loaded are answered by the
+    finder. Code that looks up the modules in ``sys.modules`` after the
+    import (eg. :func:`importlib.import_module`, :mod:`pickle`,
+    :func:`reload` or relative imports in functions called after the
+    import) does not find them.
+
+    Otherwise the modules stay in ``sys.modules`` until the environment
+    is exited and exactly these names are removed on exit. Like the
+    :class:`ProtectedEnvironment`, such environments are executed one
+    after another and other threads can see the modules while they are
+    active.
+
+    The finder is inserted in front of ``sys.meta_path`` when the
+    importer has a high priority or does not use ``sys.path``. Otherwise
+    it is appended and top-level modules that can also be found in
+    ``sys.path`` are left to the default import mechanism. The entries
+    of the search-paths are only probed for a module if their cached
+    listing contains it, see :func:`get_dir_listing`.
+
+    When the importer has :attr:`~Importer.share_modules` enabled, the
+    top-level modules are looked up in the process-wide store of shared
+    modules first and the modules loaded by the environment are added
+    to the store on exit.
+    """
+
+    def __init__(self, importer):
+        super(IsolatedEnvironment, self).__init__()
+        self.importer = importer
+
+        # Names of the modules that have been imported through the
+        # environment in the order they have been imported, and the
+        # modules by their name.
+        self.names = []
+        self.name_set = set()
+        self.modules = {}
+
+        # True while the modules are in `sys.modules`, the modules that
+        # have been replaced in `sys.modules` by ours and the names of
+        # modules that have been put there again while thread isolated.
+        self.active = False
+        self.shadowed = {}
+        self.inserted = []
+
+        # The number of nested module loads in progress and the index
+        # in `names` at which the outermost one started.
+        self.depth = 0
+        self.start = 0
+
+        # Names of submodules of our packages that could not be found.
+        # Python marks them with None in `sys.modules`.
+        self.missing = []
+
+        # Maps the top-level modules resolved with `share_modules` to a
+        # tuple of their content hash and the `SharedTree` they are
+        # served from, or None if they are loaded by this environment.
+        self.shared = {}
+
+    def __enter__(self):
+        importer = self.importer
+        self.thread = thread.get_ident()
+        _next_listing_generation()
+        self.thread_isolated = importer.thread_isolated
+        if not self.thread_isolated:
+            _protected_lock.acquire()
+
+        # Python iterates over `sys.meta_path` with the import lock held.
+        imp.acquire_lock()
+        try:
+            if importer.high_priority or not importer.use_sys_path:
+                sys.meta_path.insert(0, self)
+            else:
+                sys.meta_path.append(self)
+            self.active = not self.thread_isolated
+        except:
+            if not self.thread_isolated:
+                _protected_lock.release()
+            raise
+        finally:
+            imp.release_lock()
+
+        return None
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        imp.acquire_lock()
+        try:
+            if self.active:
+                self._deactivate()
+            sys.meta_path.remove(self)
+        finally:
+            imp.release_lock()
+            if not self.thread_isolated:
+                _protected_lock.release()
+
+        if self.shared and exc_type is None:
+            self._publish_shared()
+
+        for name in self.names:
+            self.importer._store_module(name, self.modules[name])
+
+        if self.importer.trace_file:
+            self.importer._update_trace_file()
+
+        self.names = []
+        self.name_set = set()
+        self.modules = {}
+        self.shared = {}
+
+    def _insert(self, name, module):
+        r"""
+        Private. Puts *module* into ``sys.modules`` while a module is
+        loaded in thread isolated mode, it is taken out again by
+        :meth:`_deactivate`.
+        """
+
+        modules = sys.modules
+        previous = modules.get(name)
+        if previous is module:
+            return
+        if previous is not None:
+            self.shadowed.setdefault(name, previous)
+        modules[name] = module
+        self.inserted.append(name)
+
+    def _begin_load(self, fullname):
+        r"""
+        Private. Called before the module *fullname* is loaded in thread
+        isolated mode, with the import lock held. Puts the parent
+        packages of the module into ``sys.modules``.
+        """
+
+        if not self.depth:
+            self.start = len(self.names)
+            self.active = True
+        self.depth += 1
+
+        parent = fullname.rpartition('.')[0]
+        while parent:
+            module = self.modules.get(parent)
+            if module is not None:
+                self._insert(parent, module)
+            parent = parent.rpartition('.')[0]
+
+    def _end_load(self):
+        r"""
+        Private. Called after a module has been loaded in thread isolated
+        mode. Takes the modules out of ``sys.modules`` when the outermost
+        load returns.
+        """
+
+        self.depth -= 1
+        if not self.depth:
+            self._deactivate(self.start)
+
+    def _deactivate(self, start=0):
+        r"""
+        Private. Takes the modules of the environment that have been
+        imported since the index *start* in :attr:`names` out of
+        ``sys.modules``, as well as the ones put there by
+        :meth:`_insert`. Must be called with the import lock held.
+        """
+
+        modules = sys.modules
+        failed = set()
+        for name in self.names[start:]:
+            module = modules.pop(name, None)
+            if module is not None:
+                self.modules[name] = module
+            else:
+                self.modules.pop(name, None)
+                failed.add(name)
+
+        if failed:
+            self.names = [name for name in self.names if name not in failed]
+            self.name_set -= failed
+
+        for name in self.inserted:
+            modules.pop(name, None)
+        self.inserted = []
+
+        for name in self.missing:
+            if name in modules and modules[name] is None:
+                del modules[name]
+        self.missing = []
+
+        modules.update(self.shadowed)
+        self.shadowed = {}
+        self.active = False
+
+    def _publish_shared(self):
+        r"""
+        Private. Adds the modules loaded by the environment to the
+        shared store: new :class:`SharedTree` objects for the top-level
+        modules loaded from our paths, and submodules that have been
+        imported additionally to the trees we are served from.
+        """
+
+        trees = {}
+        for name in self.names:
+            root = name.partition('.')[0]
+            trees.setdefault(root, {})[name] = self.modules[name]
+
+        with _shared_lock:
+            for root, (content_hash, tree) in self.shared.iteritems():
+                modules = trees.get(root)
+                if not modules or root not in modules and tree is None:
+                    continue
+
+                if tree is None:
+                    deps = self._get_dependencies(root, trees)
+                    tree = SharedTree(root, content_hash, deps, modules)
+                    _shared_store.setdefault((root, content_hash), []) \
+                            .append(tree)
+                else:
+                    for name, module in modules.iteritems():
+                        tree.modules.setdefault(name, module)
+
+    def _get_dependencies(self, root, trees):
+        r"""
+        Private. Returns a dictionary of the names and content hashes of
+        the other top-level modules from our paths that the modules of
+        *root* depend on, directly or through other modules. *trees*
+        maps the top-level names to the modules loaded by the
+        environment.
+        """
+
+        root_hashes = self.importer._root_hashes
+        stored = self.importer.modules or {}
+
+        deps = {}
+        pending = [root]
+        while pending:
+            current = pending.pop()
+            modules = trees.get(current)
+            if modules is None:
+                modules = dict((name, module) for name, module in
+                               stored.iteritems()
+                               if name.partition('.')[0] == current)
+
+            for module in modules.itervalues():
+                for value in module.__dict__.itervalues():
+                    if isinstance(value, types.ModuleType):
+                        name = value.__name__
+                    else:
+                        name = getattr(value, '__module__', None)
+                    if not isinstance(name, basestring):
+                        continue
+
+                    name = name.partition('.')[0]
+                    if name != root and name not in deps and \
+                            name in root_hashes:
+                        deps[name] = root_hashes[name]
+                        pending.append(name)
+
+        return deps
+
+    def _get_shared_tree(self, fullname, loader):
+        r"""
+        Private. Returns the :class:`SharedTree` for the top-level module
+        *fullname* that has been found with *loader* or None if there is
+        none that can be used by the importer. The content hash is
+        remembered to publish the module on exit.
+        """
+
+        content_hash = loader.get_content_hash(fullname)
+        self.importer._root_hashes[fullname] = content_hash
+
+        with _shared_lock:
+            trees = list(_shared_store.get((fullname, content_hash), ()))
+
+        for tree in trees:
+            for name, dep_hash in tree.deps.iteritems():
+                if self._get_root_hash(name) != dep_hash:
+                    break
+            else:
+                self.shared[fullname] = (content_hash, tree)
+                return tree
+
+        self.shared[fullname] = (content_hash, None)
+        return None
+
+    def _get_root_hash(self, name):
+        r"""
+        Private. Returns the content hash of the top-level module *name*
+        as resolved by the importer or None if it is not resolved from
+        the importer's paths.
+        """
+
+        importer = self.importer
+        if name in importer._root_hashes:
+            return importer._root_hashes[name]
+
+        loader = self._find_in_path(name, name, importer.path)
+        if not loader:
+            return None
+        loader.close()
+        if not importer.high_priority and importer.use_sys_path and \
+                self._in_sys_path(name):
+            return None
+
+        content_hash = loader.get_content_hash(name)
+        importer._root_hashes[name] = content_hash
+        return content_hash
+
+    # PEP 302 finder
+
+    def _add_name(self, fullname):
+        self.names.append(fullname)
+        self.name_set.add(fullname)
+
+    def _serve(self, fullname, module):
+        r"""
+        Private. Called by the loaders to return the already loaded
+        *module* for *fullname*.
+        """
+
+        if fullname not in self.name_set:
+            self._add_name(fullname)
+            self.modules[fullname] = module
+        if not self.thread_isolated:
+            sys.modules[fullname] = module
+        elif self.depth:
+            self._insert(fullname, module)
+        return module
+
+    def _load_module(self, fullname, load):
+        r"""
+        Private. Called by the loaders to load the module *fullname* by
+        calling *load*. Tracks the module and records the import in
+        the importer's :attr:`~Importer.profiler` and
+        :attr:`~Importer.trace` and with :mod:`c4dtools.tracing`.
+        """
+
+        if self.thread_isolated:
+            self._begin_load(fullname)
+        try:
+            self._add_name(fullname)
+            index = self.importer._record_import(fullname)
+            profiler = self.importer.profiler
+            with tracing.span('import ' + fullname, 'import'):
+                if profiler is None:
+                    module = load()
+                else:
+                    record = profiler.begin(fullname)
+                    try:
+                        module = load()
+                        record.filename = getattr(module, '__file__', None)
+                    finally:
+                        profiler.end(record)
+        finally:
+            if self.thread_isolated:
+                self._end_load()
+
+        self.importer.trace[index] = (fullname,
+                                      getattr(module, '__file__', None))
+        return module
+
+    def find_module(self, fullname, path=None):
+        # Imports of other threads.
+        if thread.get_ident() != self.thread:
+            return None
+
+        importer = self.importer
+        parent, __, name = fullname.rpartition('.')
+
+        # Submodules are only handled for packages from this environment.
+        if parent and parent not in self.name_set:
+            return None
+
+        # Loaded before while thread isolated.
+        if fullname in self.modules:
+            return StoredModuleLoader(self, self.modules[fullname])
+
+        if importer.modules and fullname in importer.modules:
+            return StoredModuleLoader(self, importer.modules[fullname])
+
+        if parent and self.shared:
+            tree = self.shared.get(fullname.partition('.')[0], (None,))[1]
+            if tree and fullname in tree.modules:
+                return StoredModuleLoader(self, tree.modules[fullname])
+
+        if parent:
+            search_path = path or ()
+        else:
+            search_path = importer.path
+
+        loader = self._find_in_path(fullname, name, search_path)
+        if not loader:
+            if parent:
+                self.missing.append(fullname)
+            return None
+
+        if not parent and not importer.high_priority and \
+                importer.use_sys_path and self._in_sys_path(name):
+            loader.close()
+            return None
+
+        if not parent and importer.share_modules:
+            tree = self._get_shared_tree(fullname, loader)
+            if tree:
+                loader.close()
+                return SharedModuleLoader(self, tree)
+
+        return loader
+
+    def _find_in_path(self, fullname, name, search_path):
+        r"""
+        Private. Returns a loader for the module *fullname* from the
+        first entry of *search_path* it can be found in, or None.
+        """
+
+        for entry in search_path:
+            bundle_importer = get_bundle_importer(entry)
+            if bundle_importer:
+                if bundle_importer.find_module(fullname):
+                    return HookLoader(self, bundle_importer)
+                continue
+
+            # Most of the entries do not contain the module, the cached
+            # listing saves probing the file system for every suffix.
+            if not _may_contain(entry, name):
+                continue
+
+            try:
+                info = imp.find_module(name, [entry])
+            except ImportError:
+                continue
+            return self._get_source_loader(info) or ModuleLoader(self, info)
+
+        return None
+
+    def _get_source_loader(self, info):
+        r"""
+        Private. Returns a :class:`SourceLoader` for the module described
+        by the :func:`imp.find_module` result *info* if the module is a
+        source file or a package with a source ``__init__`` file and the
+        importer has a :attr:`~Importer.bytecode_cache` or preloaded its
+        code, see :meth:`Importer.preload`.
+        """
+
+        importer = self.importer
+        cache_dir = importer.bytecode_cache
+        if not cache_dir and not importer._preloaded and \
+                not importer._preloading:
+            return None
+
+        fp, pathname, description = info
+        if description[2] == imp.PY_SOURCE:
+            if importer._claim_preloaded(pathname) or cache_dir:
+                fp.close()
+                return SourceLoader(self, pathname, None, cache_dir)
+        elif description[2] == imp.PKG_DIRECTORY:
+            filename = os.path.join(pathname, '__init__.py')
+            if (importer._claim_preloaded(filename) or cache_dir) and \
+                    os.path.isfile(filename):
+                return SourceLoader(self, filename, [pathname], cache_dir)
+
+        return None
+
+    def _in_sys_path(self, name):
+        r"""
+        Private. Returns True if the top-level module *name* can be
+        found in ``sys.path``. Entries handled by a path hook (eg. zip
+        files) are asked through their importer.
+        """
+
+        for entry in sys.path:
+            finder = _get_path_importer(entry)
+            if finder is not None:
+                if finder.find_module(name):
+                    return True
+                continue
+
+            if not _may_contain(entry, name):
+                continue
+            try:
+                info = imp.find_module(name, [entry])
+            except ImportError:
+                continue
+            if info[0]:
+                info[0].close()
+            return True
+
+        return False
+
+def _get_path_importer(entry):
+    r"""
+    Private. Returns the importer of the path hooks for the ``sys.path``
+    entry *entry*, or None if the entry is handled by the default import
+    mechanism. The result is stored in ``sys.path_importer_cache`` like
+    Python does (see :func:`pkgutil.get_importer`).
+    """
+
+    try:
+        finder = sys.path_importer_cache[entry]
+    except KeyError:
+        finder = None
+        for hook in sys.path_hooks:
+            try:
+                finder = hook(entry)
+                break
+            except ImportError:
+                pass
+        sys.path_importer_cache[entry] = finder
+
+    # Python caches NullImporter objects for entries that do not exist.
+    if finder is None or isinstance(finder, imp.NullImporter):
+        return None
+    return finder
+
+class ModuleLoader(object):
+    r"""
+    *New in 1.3.2*. :pep:`302` loader returned by the
+    :class:`IsolatedEnvironment` for a module found in the importer's
+    paths. *info* is the tuple returned by :func:`imp.find_module`.
+    """
+
+    def __init__(self, env, info):
+        super(ModuleLoader, self).__init__()
+        self.env = env
+        self.info = info
+
+    def close(self):
+        r"""
+        Closes the file opened by :func:`imp.find_module`. Called when
+        the module will not be loaded.
+        """
+
+        if self.info[0]:
+            self.info[0].close()
+
+    def get_content_hash(self, fullname):
+        return get_content_hash(self.info[1])
+
+    def load_module(self, fullname):
+        fp, pathname, description = self.info
+        try:
+            return self.env._load_module(fullname, lambda: imp.load_module(
+                    fullname, fp, pathname, description))
+        finally:
+            if fp:
+                fp.close()
+
+class HookLoader(object):
+    r"""
+    *New in 1.3.2*. Wraps the :pep:`302` *loader* found by the
+    :class:`IsolatedEnvironment` to track the loaded module.
+    """
+
+    def __init__(self, env, loader):
+        super(HookLoader, self).__init__()
+        self.env = env
+        self.loader = loader
+
+    def close(self):
+        pass
+
+    def get_content_hash(self, fullname):
+        return self.loader.get_content_hash(fullname)
+
+    def load_module(self, fullname):
+        return self.env._load_module(fullname,
+                lambda: self.loader.load_module(fullname))
+
+class SourceLoader(object):
+    r"""
+    *New in 1.3.2*. :pep:`302` loader returned by the
+    :class:`IsolatedEnvironment` for source modules when the importer
+    has a :attr:`~Importer.bytecode_cache` or preloaded the code of the
+    module. *path* is the ``__path__`` of the module if it is a package,
+    otherwise None. *cache_dir* may be None.
+    """
+
+    def __init__(self, env, filename, path, cache_dir):
+        super(SourceLoader, self).__init__()
+        self.env = env
+        self.filename = filename
+        self.path = path
+        self.cache_dir = cache_dir
+
+    def close(self):
+        pass
+
+    def get_source(self, fullname):
+        with open(self.filename, 'rb') as fp:
+            return fp.read()
+
+    def get_code(self, fullname):
+        code = self.env.importer._take_preloaded(self.filename)
+        if code is not None:
+            return code
+        if self.cache_dir:
+            return load_cached_code(self.filename, self.cache_dir)
+        return load_code(self.filename)
+
+    def get_content_hash(self, fullname):
+        if self.path:
+            return get_content_hash(self.path[0])
+        return get_content_hash(self.filename)
+
+    def load_module(self, fullname):
+        return self.env._load_module(fullname, lambda: _exec_module(
+                fullname, self.get_code(fullname), self.filename, self,
+                self.path))
+
+class StoredModuleLoader(object):
+    r"""
+    *New in 1.3.2*. :pep:`302` loader returned by the
+    :class:`IsolatedEnvironment` for a module that has been stored in
+    the :class:`Importer` before.
+    """
+
+    def __init__(self, env, module):
+        super(StoredModuleLoader, self).__init__()
+        self.env = env
+        self.module = module
+
+    def load_module(self, fullname):
+        return self.env._serve(fullname, self.module)
+
+class SharedTree(object):
+    r"""
+    *New in 1.3.2*. A top-level module and its submodules in the store
+    of modules shared by Importers with :attr:`~Importer.share_modules`
+    enabled.
+
+    .. attribute:: name
+
+        The name of the top-level module.
+
+    .. attribute:: content_hash
+
+        The content hash of the module, see :func:`get_content_hash`.
+
+    .. attribute:: deps
+
+        A dictionary of the names and content hashes of the other
+        top-level modules the modules depend on.
+
+    .. attribute:: modules
+
+        A dictionary of the module objects by their full name.
+    """
+
+    def __init__(self, name, content_hash, deps, modules):
+        super(SharedTree, self).__init__()
+        self.name = name
+        self.content_hash = content_hash
+        self.deps = deps
+        self.modules = modules
+
+    def __repr__(self):
+        return '<SharedTree %r %s (%d modules)>' % (self.name,
+                self.content_hash[:12], len(self.modules))
+
+class SharedModuleLoader(object):
+    r"""
+    *New in 1.3.2*. :pep:`302` loader returned by the
+    :class:`IsolatedEnvironment` for a top-level module that is served
+    from a :class:`SharedTree`. The submodules in the tree are put into
+    ``sys.modules`` together with the top-level module.
+    """
+
+    def __init__(self, env, tree):
+        super(SharedModuleLoader, self).__init__()
+        self.env = env
+        self.tree = tree
+
+    def close(self):
+        pass
+
+    def _install(self):
+        env = self.env
+        with _shared_lock:
+            modules = sorted(self.tree.modules.items())
+        for name, module in modules:
+            if name != self.tree.name:
+                env._serve(name, module)
+            else:
+                sys.modules[name] = module
+        return sys.modules[self.tree.name]
+
+    def load_module(self, fullname):
+        return self.env._load_module(fullname, self._install)
+
+class Bundle(object):
+    r"""
+    *New in 1.3.2*. The contents of a bundle archive created with
+    :func:`build_bundle`. The archive is read into memory with a single
+    open, its members are served from the in-memory index. Use
+    :func:`get_bundle` to obtain the shared instance for a file.
+
+    .. attribute:: filename
+
+        The filename of the archive.
+
+    .. attribute:: names
+
+        A set of the member names in the archive.
+    """
+
+    def __init__(self, filename):
+        super(Bundle, self).__init__()
+        with open(filename, 'rb') as fp:
+            data = fp.read()
+
+        self.filename = filename
+        self.zipfile = zipfile.ZipFile(StringIO.StringIO(data))
+        self.names = set(self.zipfile.namelist())
+        self.lock = threading.Lock()
+
+        # Content hashes of the modules by their base name.
+        self.hashes = {}
+
+    def read(self, name):
+        r"""
+        Returns the data of the member *name*.
+        """
+
+        with self.lock:
+            return self.zipfile.read(name)
+
+def get_bundle(filename):
+    r"""
+    *New in 1.3.2*. Returns the :class:`Bundle` for the archive
+    *filename*. The bundle is loaded once per process and reloaded when
+    the modification time of the archive changes.
+    """
+
+    mtime = _get_mtime(filename)
+    entry = _bundle_cache.get(filename)
+    if entry and entry[0] == mtime:
+        return entry[1]
+
+    bundle = Bundle(filename)
+    _bundle_cache[filename] = (mtime, bundle)
+    return bundle
+
+def get_bundle_importer(path):
+    r"""
+    *New in 1.3.2*. Returns a :class:`BundleImporter` for the search-path
+    entry *path* if it points to a bundle or to a directory inside of a
+    bundle, otherwise None. The result is cached process-wide.
+    """
+
+    if path in _bundle_importers:
+        return _bundle_importers[path]
+
+    # Find the archive file in the path, the rest of the path is the
+    # prefix in the archive.
+    result = None
+    archive = path
+    prefix = []
+    while archive and not os.path.isdir(archive):
+        if os.path.isfile(archive):
+            if zipfile.is_zipfile(archive):
+                prefix = ''.join(x + '/' for x in reversed(prefix))
+                result = BundleImporter(archive, prefix)
+            break
+
+        archive, tail = os.path.split(archive)
+        if not tail:
+            break
+        prefix.append(tail)
+
+    _bundle_importers[path] = result
+    return result
+
+class BundleImporter(object):
+    r"""
+    *New in 1.3.2*. :pep:`302` importer for modules in a :class:`Bundle`.
+    It is used by the :class:`IsolatedEnvironment` for search-path
+    entries that point to an archive or a package in an archive.
+    Bytecode files in the archive are used if they have been compiled
+    for the running Python version, otherwise the source is compiled.
+
+    .. attribute:: archive
+
+        The filename of the archive.
+
+    .. attribute:: prefix
+
+        The directory in the archive, ending with a slash or empty.
+    """
+
+    def __init__(self, archive, prefix=''):
+        super(BundleImporter, self).__init__()
+        self.archive = archive
+        self.prefix = prefix
+
+    @property
+    def bundle(self):
+        return get_bundle(self.archive)
+
+    def _get_info(self, fullname):
+        r"""
+        Private. Returns a tuple of ``(basename, is_package)`` for the
+        module or None if it is not in the bundle.
+        """
+
+        names = self.bundle.names
+        base = self.prefix + fullname.rpartition('.')[2]
+        for basename, is_package in ((base + '/__init__', True),
+                                     (base, False)):
+            for sufx in (_bytecode_suffix, '.py'):
+                if basename + sufx in names:
+                    return basename, is_package
+        return None
+
+    def _get_filename(self, name):
+        return os.path.join(self.archive, *name.split('/'))
+
+    def find_module(self, fullname, path=None):
+        if self._get_info(fullname):
+            return self
+        return None
+
+    def is_package(self, fullname):
+        info = self._get_info(fullname)
+        if not info:
+            raise ImportError('can not find module %r' % fullname)
+        return info[1]
+
+    def get_source(self, fullname):
+        info = self._get_info(fullname)
+        if not info:
+            raise ImportError('can not find module %r' % fullname)
+
+        name = info[0] + '.py'
+        if name in self.bundle.names:
+            return self.bundle.read(name)
+        return None
+
+    def get_code(self, fullname):
+        info = self._get_info(fullname)
+        if not info:
+            raise ImportError('can not find module %r' % fullname)
+
+        # The code gets the same filename as the module's `__file__`,
+        # the bytecode has been compiled with the name in the archive.
+        bundle = self.bundle
+        filename = self.get_filename(fullname)
+        name = info[0] + _bytecode_suffix
+        if name in bundle.names:
+            data = bundle.read(name)
+            if data[:4] == imp.get_magic():
+                return _replace_co_filename(marshal.loads(data[8:]),
+                                            filename)
+
+        source = self.get_source(fullname)
+        if source is None:
+            raise ImportError('bad magic number in %r and no source '
+                              'available' % self._get_filename(name))
+
+        return _compile_source(source, filename)
+
+    def get_content_hash(self, fullname):
+        r"""
+        Returns a hash of the members of the module like
+        :func:`get_content_hash` does for a file or directory.
+        """
+
+        info = self._get_info(fullname)
+        if not info:
+            raise ImportError('can not find module %r' % fullname)
+
+        bundle = self.bundle
+        content_hash = bundle.hashes.get(info[0])
+        if content_hash is not None:
+            return content_hash
+
+        basename, is_package = info
+        if is_package:
+            root = basename.rpartition('/')[0] + '/'
+            members = [name for name in bundle.names
+                       if name.startswith(root) and not name.endswith('/')]
+        else:
+            members = [name for name in (basename + '.py',
+                                         basename + _bytecode_suffix)
+                       if name in bundle.names]
+
+        names = set(members)
+        digest = hashlib.sha1()
+        for name in sorted(members):
+            if not _skip_bytecode(name, names):
+                _update_hash(digest, name[len(self.prefix):],
+                             bundle.read(name))
+
+        content_hash = bundle.hashes[info[0]] = digest.hexdigest()
+        return content_hash
+
+    def get_data(self, pathname):
+        r"""
+        Returns the data of a file in the archive, *pathname* being
+        relative to the archive or starting with its filename.
+        """
+
+        if pathname.startswith(self.archive + os.sep):
+            pathname = pathname[len(self.archive) + 1:]
+        name = pathname.replace(os.sep, '/')
+        if name not in self.bundle.names:
+            raise IOError('file not found in bundle: %r' % pathname)
+        return self.bundle.read(name)
+
+    def get_filename(self, fullname):
+        info = self._get_info(fullname)
+        if not info:
+            raise ImportError('can not find module %r' % fullname)
+
+        name = info[0] + '.py'
+        if name not in self.bundle.names:
+            name = info[0] + _bytecode_suffix
+        return self._get_filename(name)
+
+    def load_module(self, fullname):
+        code = self.get_code(fullname)
+        basename, is_package = self._get_info(fullname)
+
+        path = None
+        if is_package:
+            path = [self._get_filename(basename.rpartition('/')[0])]
+        return _exec_module(fullname, code, self.get_filename(fullname),
+                            self, path)
+
+def _exec_module(fullname, code, filename, loader, path=None):
+    r"""
+    Private. Creates the module *fullname* in ``sys.modules`` and executes
+    *code* in it. *path* is the ``__path__`` if the module is a package.
+    The module is removed from ``sys.modules`` if an exception occurs.
+    """
+
+    module = imp.new_module(fullname)
+    module.__file__ = filename
+    module.__loader__ = loader
+    if path is not None:
+        module.__path__ = path
+        module.__package__ = fullname
+    else:
+        module.__package__ = fullname.rpartition('.')[0]
+
+    sys.modules[fullname] = module
+    try:
+        exec code in module.__dict__
+    except:
+        if sys.modules.get(fullname) is module:
+            del sys.modules[fullname]
+        raise
+
+    return sys.modules[fullname]
+
+def get_bytecode_cache_dir():
+    r"""
+    *New in 1.3.2*. Returns the default per-user directory for the
+    :attr:`Importer.bytecode_cache`. The directory is not created.
+    """
+
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.environ.get('APPDATA')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME')
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'c4dtools', 'bytecode')
+
+def load_cached_code(filename, cache_dir):
+    r"""
+    *New in 1.3.2*. Returns the code object of the source file
+    *filename*. The bytecode is read from *cache_dir* if it has been
+    cached for the current modification time and size of the file and
+    the running Python version. Otherwise, the source is compiled and
+    the bytecode is written to *cache_dir*. Failing to write the cache
+    is silently ignored.
+
+    The cache file is named by a hash of the absolute path of the source
+    file, so the cache can be shared by all plugins.
+    """
+
+    st = os.stat(filename)
+    fingerprint = (int(st.st_mtime) & 0xffffffff, st.st_size & 0xffffffff)
+    header = imp.get_magic() + struct.pack('<II', *fingerprint)
+
+    key = os.path.normcase(os.path.abspath(filename))
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    cache_name = os.path.join(cache_dir, hashlib.sha1(key).hexdigest() +
+                              _bytecode_suffix)
+
+    try:
+        with open(cache_name, 'rb') as fp:
+            data = fp.read()
+    except IOError:
+        data = None
+
+    if data and data[:len(header)] == header:
+        try:
+            return marshal.loads(data[len(header):])
+        except (EOFError, ValueError, TypeError):
+            pass
+
+    with open(filename, 'rb') as fp:
+        code = _compile_source(fp.read(), filename)
+
+    # Write to a temporary file first so other processes never read
+    # an incomplete cache file.
+    temp_name = '%s.%d.tmp' % (cache_name, os.getpid())
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with open(temp_name, 'wb') as fp:
+            fp.write(header + marshal.dumps(code))
+        if os.path.exists(cache_name):
+            os.remove(cache_name)
+        os.rename(temp_name, cache_name)
+    except (IOError, OSError):
+        try:
+            os.remove(temp_name)
+        except OSError:
+            pass
+
+    return code
+
+def _replace_co_filename(code, filename):
+    r"""
+    Private. Returns the code object *code* with the ``co_filename`` of
+    it and of the code objects nested in it replaced by *filename*.
+    """
+
+    if code.co_filename == filename:
+        return code
+
+    consts = tuple(_replace_co_filename(x, filename)
+                   if isinstance(x, types.CodeType) else x
+                   for x in code.co_consts)
+    return types.CodeType(code.co_argcount, code.co_nlocals,
+                          code.co_stacksize, code.co_flags, code.co_code,
+                          consts, code.co_names, code.co_varnames,
+                          filename, code.co_name, code.co_firstlineno,
+                          code.co_lnotab, code.co_freevars,
+                          code.co_cellvars)
+
+def _compile_source(source, filename):
+    r"""
+    Private. Compiles the Python *source* code. Line-endings are
+    normalized like when importing a module.
+    """
+
+    source = source.replace('\r\n', '\n').replace('\r', '\n')
+    if not source.endswith('\n'):
+        source += '\n'
+    return compile(source, filename, 'exec', dont_inherit=True)
+
+def load_code(filename):
+    r"""
+    *New in 1.3.2*. Returns the code object of the source file
+    *filename* like the import mechanism would create it. The bytecode
+    file next to the source is used if it has been compiled from the
+    current version of the file, otherwise the source is compiled. No
+    bytecode file is written.
+    """
+
+    mtime = int(os.stat(filename).st_mtime) & 0xffffffff
+    header = imp.get_magic() + struct.pack('<I', mtime)
+    try:
+        with open(filename[:-3] + _bytecode_suffix, 'rb') as fp:
+            data = fp.read()
+    except IOError:
+        data = None
+
+    if data and data[:len(header)] == header:
+        try:
+            return marshal.loads(data[len(header):])
+        except (EOFError, ValueError, TypeError):
+            pass
+
+    with open(filename, 'rb') as fp:
+        return _compile_source(fp.read(), filename)
+
+def load_trace(filename):
+    r"""
+    *New in 1.3.2*. Returns the list of ``(name, filename)`` tuples saved
+    with :meth:`Importer.save_trace` or an empty list if the file does
+    not exist or is invalid.
+    """
+
+    try:
+        with open(filename) as fp:
+            data = json.load(fp)
+        result = []
+        for entry in data['modules']:
+            modfile = entry['filename']
+            if isinstance(modfile, unicode):
+                modfile = modfile.encode(_fs_encoding)
+            result.append((str(entry['name']), modfile))
+        return result
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        return []
+
+def build_bundle(dirname, filename=None, include_source=False):
+    r"""
+    *New in 1.3.2*. Creates a bundle from the library folder *dirname*
+    that can be passed to :meth:`Importer.add` (and is picked up by
+    :func:`c4dtools.prepare`). All Python modules are compiled to
+    bytecode, other files are added as they are. Extension modules can
+    not be imported from an archive and are skipped with a warning.
+
+    The bytecode is only used by the same Python version, run this
+    function with the Python interpreter of the targeted Cinema 4D
+    version. If *include_source* is True, the source files are added
+    additionally and will be used by other Python versions and for
+    tracebacks.
+
+    :param dirname: The library folder, eg. the ``lib`` folder of a
+            plugin.
+    :param filename: The filename of the bundle. Defaults to *dirname*
+            with a ``.zip`` suffix.
+    :return: The filename of the bundle.
+    """
+
+    dirname = os.path.normpath(dirname)
+    if not os.path.isdir(dirname):
+        raise OSError("'%s' is not a directory." % dirname)
+    if filename is None:
+        filename = dirname + '.zip'
+
+    archive_name = os.path.basename(filename)
+    extensions = set(sufx for sufx, mode, type_ in imp.get_suffixes()
+                     if type_ == imp.C_EXTENSION)
+
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for root, dirs, files in os.walk(dirname):
+            dirs.sort()
+            relroot = os.path.relpath(root, dirname)
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                member = os.path.normpath(os.path.join(relroot, name))
+                member = member.replace(os.sep, '/')
+                base, sufx = os.path.splitext(name)
+
+                if sufx in ('.pyc', '.pyo'):
+                    continue
+                elif sufx in extensions:
+                    warnings.warn('extension module %r can not be imported '
+                                  'from a bundle, skipped.' % path)
+                    continue
+                elif sufx != '.py':
+                    zf.write(path, member)
+                    continue
+
+                with open(path, 'rb') as fp:
+                    source = fp.read()
+
+                # The modification time in the archive has a resolution
+                # of two seconds, the bytecode header must match it.
+                date_time = time.localtime(os.path.getmtime(path))[:6]
+                date_time = date_time[:5] + (date_time[5] // 2 * 2,)
+                mtime = int(time.mktime(date_time + (0, 0, -1)))
+
+                code = _compile_source(source, '/'.join([archive_name,
+                                                         member]))
+                data = imp.get_magic() + struct.pack('<I', mtime) + \
+                       marshal.dumps(code)
+                members = [(member[:-3] + _bytecode_suffix, data)]
+                if include_source:
+                    members.append((member, source))
+
+                for member, data in members:
+                    info = zipfile.ZipInfo(member, date_time)
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    zf.writestr(info, data)
 
+    return filename
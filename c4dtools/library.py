@@ -82,11 +82,56 @@ This library can now be loaded from another Python unit.
     import c4dtools
     MyLibrary = c4dtools.load_library('MyLibrary')
     print MyLibrary.get_stuff()
+
+*New in 1.3.2*: The calls to library methods can be instrumented to find
+out which libraries are hot. When enabled (or when ``instrument=True``
+is defined in the Meta section), the methods of the libraries created
+afterwards record the number of calls, the cumulative and maximum
+duration and the exceptions they raised. Setting the
+``C4DTOOLS_LIBRARY_STATS`` environment variable to a filename enables the
+instrumentation and writes the statistics to that file on exit.
+
+.. code-block:: python
+
+    c4dtools.library.enable_call_stats()
+    # ...
+    for stats in c4dtools.library.get_call_stats():
+        print stats['name'], stats['calls'], stats['total']
+
+*New in 1.3.2*: A plugin providing libraries does not need to import
+them at startup. It can register the modules defining its libraries
+with a library manifest instead. The module is then imported when the
+library is loaded for the first time. The paths are relative to the
+directory of the manifest, the module is imported with an
+:class:`~c4dtools.importer.Importer` using these paths.
+
+.. code-block:: none
+
+    {
+      "version": 1,
+      "libraries": {
+        "MyLibrary": {"module": "mylibrary", "path": ["lib"]}
+      }
+    }
+
+.. code-block:: python
+
+    c4dtools.library.load_manifest(os.path.join(dirname, 'libraries.json'))
 """
 
+import os
+import imp
 import copy
+import json
+import time
 import types
+import atexit
+import timeit
+import weakref
+import functools
+import threading
 
+from c4dtools import tracing
 from c4dtools.utils import clsname
 from c4dtools.helpers import Attributor
 
@@ -120,9 +165,11 @@ class LibraryMeta(type):
         'abstract': False,
         'name': None,
         'allow_overwrite': False,
+        'instrument': None,
     }
 
     __installed = {}
+    __callbacks = {}
 
     def __new__(self, name, bases, dict):
         super_new = super(LibraryMeta, self).__new__
@@ -152,8 +199,13 @@ class LibraryMeta(type):
 
         # Turn all functions that would be turned into instance methods
         # into class methods.
+        instrument = meta.instrument
+        if instrument is None:
+            instrument = _stats_enabled
         for key, value in dict.items():
             if isinstance(value, types.FunctionType):
+                if instrument and not key.startswith('__'):
+                    value = _instrument(meta.name, value)
                 dict[key] = classmethod(value)
 
         # Create the class and call its on_create() method.
@@ -172,6 +224,9 @@ class LibraryMeta(type):
             self.__installed[meta.name] = library
             library.on_install(meta.name)
 
+            for callback in list(self.__callbacks.get(meta.name, ())):
+                callback(library)
+
         return library
 
     def on_create(self):
@@ -196,13 +251,44 @@ class LibraryMeta(type):
 
         Raises: LibraryNotFound when there is not library with this
                 name installed.
+
+        *Changed in 1.3.2*: The module providing the library is imported
+        if it has been registered with :func:`register_provider` or
+        :func:`load_manifest` and the library is not installed yet.
         """
 
+        if not name in self.__installed:
+            _import_provider(name)
         if not name in self.__installed:
             raise LibraryNotFound('no library with name %r installed.' % name)
 
         return self.__installed[name]
 
+    @classmethod
+    def add_install_callback(self, name, callback):
+        r"""
+        *New in 1.3.2*. Registers *callback* to be called with the
+        library class every time a library is installed with the passed
+        name. If a library is already installed with this name, the
+        callback is called immediately.
+        """
+
+        self.__callbacks.setdefault(name, []).append(callback)
+        library = self.__installed.get(name)
+        if library is not None:
+            callback(library)
+
+    @classmethod
+    def remove_install_callback(self, name, callback):
+        r"""
+        *New in 1.3.2*. Removes a callback registered with
+        :meth:`add_install_callback`.
+        """
+
+        callbacks = self.__callbacks.get(name)
+        if callbacks and callback in callbacks:
+            callbacks.remove(callback)
+
 class Library(object):
     r"""
     This is the base class for library objects. It's metaclass
@@ -216,33 +302,353 @@ class LazyLibrary(object):
     r"""
     This class is representing a lazy reference to a library. The actual
     library will be loaded on the first request.
+
+    *Changed in 1.3.2*: The reference is resolved when the library is
+    installed (see :meth:`LibraryMeta.add_install_callback`) instead of
+    looking it up on every attribute access. The methods of the library
+    are bound to the reference on their first access, so calling them
+    costs a single attribute lookup. Other attributes are read from the
+    library every time. When a library that allows to be overwritten is
+    installed again, the reference is bound to the new library.
+    Accessing an attribute before the library is installed raises
+    :class:`LibraryNotFound`.
     """
 
     def __init__(self, libname):
         super(LazyLibrary, self).__init__()
         self.__libname = libname
+        self.__library = None
+
+        # The callback must not keep the reference alive, it is removed
+        # when the reference is collected.
+        def collected(ref):
+            LibraryMeta.remove_install_callback(libname, installed)
+        ref = weakref.ref(self, collected)
+        def installed(library):
+            lazy = ref()
+            if lazy is not None:
+                lazy.__bind(library)
+        LibraryMeta.add_install_callback(libname, installed)
+
+        # A library that can not be overwritten is not installed again.
+        library = self.__library
+        if library is not None and not library.Meta.allow_overwrite:
+            LibraryMeta.remove_install_callback(libname, installed)
+
+    def __repr__(self):
+        state = 'resolved' if self.__library is not None else 'unresolved'
+        return '<LazyLibrary %r (%s)>' % (self.__libname, state)
+
+    def __bind(self, library):
+        for key in self.__dict__.keys():
+            if not key.startswith('_LazyLibrary__'):
+                del self.__dict__[key]
+        self.__library = library
 
-    @property
-    def __library(self):
-        self.__library = load_library(self.__libname)
+    def __getattr__(self, name):
+        if name.startswith('_LazyLibrary__'):
+            raise AttributeError(name)
 
-        # Write each value from the loaded library into the
-        # LazyLibrary so __getattr__ does not need to be called
-        # anymore.
-        for attrname in dir(self.__library):
-            setattr(self, attrname, getattr(self.__library, attrname))
+        library = self.__library
+        if library is None:
+            library = load_library(self.__libname)
 
-    def __getattr__(self, name):
-        return getattr(self.__library, name)
+        value = getattr(library, name)
+        if isinstance(value, types.MethodType):
+            self.__dict__[name] = value
+        return value
 
-def load_library(name, lazy=False):
+def load_library(name, lazy=False, callback=None):
     r"""
     Load a library. Returns a :class:`Library` instance unless *lazy*
     does not evaluate to True. If *lazy* is True, a :class:`LazyLibrary`
     instance will be returned.
+
+    *New in 1.3.2*: *callback* is called once with the library class as
+    soon as it is available: immediately if it is already installed,
+    otherwise when it is installed. This is registered before the
+    library is loaded.
+
+    .. code-block:: python
+
+        def resolved(library):
+            library.register_tool(MyTool)
+
+        MyLibrary = c4dtools.load_library('MyLibrary', lazy=True,
+                                          callback=resolved)
     """
+
+    if callback is not None:
+        def once(library):
+            LibraryMeta.remove_install_callback(name, once)
+            callback(library)
+        LibraryMeta.add_install_callback(name, once)
+
     if lazy:
         return LazyLibrary(name)
     else:
         return LibraryMeta.get_library(name)
 
+# The modules providing libraries that are imported when the library is
+# loaded, by the library name. See register_provider().
+_providers = {}
+_provider_importers = {}
+
+def register_provider(name, module, path=()):
+    r"""
+    *New in 1.3.2*. Registers *module* as the module defining the
+    library *name*. The module is imported when the library is loaded
+    and is not installed yet. If *path* is not empty, the module is
+    imported with an :class:`~c4dtools.importer.Importer` using these
+    paths, which is shared by all providers with the same paths.
+    """
+
+    path = tuple(os.path.abspath(x) for x in path)
+    imp.acquire_lock()
+    try:
+        _providers[name] = (module, path)
+    finally:
+        imp.release_lock()
+
+def _import_provider(name):
+    r"""
+    Private. Imports the module providing the library *name* if one has
+    been registered. A provider is imported only once.
+    """
+
+    # The import lock serializes this with imports of other threads,
+    # which may load libraries from the modules they import.
+    imp.acquire_lock()
+    try:
+        provider = _providers.pop(name, None)
+        if provider is None:
+            return
+
+        # The entry is removed while the module is imported so that the
+        # module can not trigger its own import again. It is restored if
+        # the import fails, the next access retries it.
+        module, path = provider
+        try:
+            with tracing.span('import library provider', library=name,
+                              module=module):
+                if not path:
+                    __import__(module)
+                    return
+
+                importer = _provider_importers.get(path)
+                if importer is None:
+                    from c4dtools.importer import Importer
+                    importer = Importer()
+                    importer.add(*path)
+                    _provider_importers[path] = importer
+                importer.import_(module)
+        except:
+            _providers.setdefault(name, provider)
+            raise
+    finally:
+        imp.release_lock()
+
+def load_manifest(filename):
+    r"""
+    *New in 1.3.2*. Registers the modules providing libraries from the
+    library manifest *filename* (see :func:`register_provider`). Returns
+    the names of the libraries or None if the manifest does not exist
+    or is invalid.
+    """
+
+    try:
+        with open(filename) as fp:
+            data = json.load(fp)
+        if data.get('version') != 1:
+            return None
+
+        dirname = os.path.dirname(os.path.abspath(filename))
+        providers = []
+        for name, entry in data['libraries'].iteritems():
+            module = entry['module']
+            if isinstance(module, unicode):
+                module = module.encode('utf-8')
+            path = [os.path.join(dirname, x) for x in entry.get('path', ())]
+            providers.append((name, module, path))
+    except (IOError, OSError, ValueError, KeyError, TypeError,
+            AttributeError):
+        return None
+
+    for name, module, path in providers:
+        register_provider(name, module, path)
+    return [name for name, module, path in providers]
+
+def save_manifest(filename, libraries, path=()):
+    r"""
+    *New in 1.3.2*. Writes a library manifest *filename* for the
+    :class:`Library` subclasses *libraries*. The modules of the libraries
+    are imported from the directories *path* when the manifest is
+    loaded. Returns True on success, False if the file could not be
+    written.
+    """
+
+    dirname = os.path.dirname(os.path.abspath(filename))
+    path = [os.path.relpath(os.path.abspath(x), dirname) for x in path]
+    data = {'version': 1, 'libraries': {}}
+    for library in libraries:
+        data['libraries'][library.Meta.name] = {
+            'module': library.__module__,
+            'path': path,
+        }
+
+    try:
+        with open(filename, 'w') as fp:
+            json.dump(data, fp, indent=2, sort_keys=True)
+    except (IOError, OSError):
+        return False
+    return True
+
+# Statistics of instrumented library methods, keyed by the library
+# name and method name. See enable_call_stats().
+_stats_enabled = False
+_stats = {}
+_stats_lock = threading.Lock()
+_stats_files = []
+
+class CallStats(object):
+    r"""
+    *New in 1.3.2*. Statistics of the calls to an instrumented library
+    method. The durations are in seconds, *errors* maps the names of
+    the exception classes raised by the method to their count.
+    """
+
+    __slots__ = ('library', 'method', 'calls', 'total', 'max', 'errors')
+
+    def __init__(self, library, method):
+        super(CallStats, self).__init__()
+        self.library = library
+        self.method = method
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = {}
+
+    def add(self, duration, error=None):
+        with _stats_lock:
+            self.calls += 1
+            self.total += duration
+            if duration > self.max:
+                self.max = duration
+            if error is not None:
+                self.errors[error] = self.errors.get(error, 0) + 1
+
+    def as_dict(self):
+        with _stats_lock:
+            return {
+                'name': '%s.%s' % (self.library, self.method),
+                'library': self.library,
+                'method': self.method,
+                'calls': self.calls,
+                'total': self.total,
+                'max': self.max,
+                'mean': self.total / self.calls if self.calls else 0.0,
+                'errors': dict(self.errors),
+            }
+
+def _instrument(libname, func):
+    key = (libname, func.__name__)
+    with _stats_lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = CallStats(*key)
+
+    timer = timeit.default_timer
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = timer()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as exc:
+            stats.add(timer() - start, exc.__class__.__name__)
+            raise
+        stats.add(timer() - start)
+        return result
+
+    wrapper.call_stats = stats
+    return wrapper
+
+def enable_call_stats(filename=None):
+    r"""
+    *New in 1.3.2*. Enables the instrumentation of the methods of
+    libraries that are created afterwards, unless their Meta section
+    defines ``instrument=False``. If *filename* is passed, the
+    statistics are written to this file on exit. ``{pid}`` in the
+    filename is replaced by the process id.
+    """
+
+    global _stats_enabled
+    _stats_enabled = True
+    if filename:
+        filename = filename.replace('{pid}', str(os.getpid()))
+        if not _stats_files:
+            atexit.register(_dump_at_exit)
+        _stats_files.append(filename)
+
+def disable_call_stats():
+    r"""
+    *New in 1.3.2*. Libraries created afterwards are no longer
+    instrumented. Libraries that are already instrumented keep on
+    recording their calls.
+    """
+
+    global _stats_enabled
+    _stats_enabled = False
+
+def get_call_stats(library=None):
+    r"""
+    *New in 1.3.2*. Returns a list of dictionaries with the statistics
+    of the instrumented methods (see :meth:`CallStats.as_dict`), sorted
+    by the cumulative duration with the most expensive method first.
+    Pass *library* to get only the methods of the library with this
+    name.
+    """
+
+    with _stats_lock:
+        items = _stats.values()
+    if library is not None:
+        items = [x for x in items if x.library == library]
+    result = [x.as_dict() for x in items]
+    result.sort(key=lambda x: x['total'], reverse=True)
+    return result
+
+def reset_call_stats():
+    r"""
+    *New in 1.3.2*. Resets the statistics of all instrumented methods.
+    """
+
+    with _stats_lock:
+        for stats in _stats.values():
+            stats.reset()
+
+def dump_call_stats(filename):
+    r"""
+    *New in 1.3.2*. Writes the statistics returned by
+    :func:`get_call_stats` as JSON to *filename*.
+    """
+
+    data = {
+        'pid': os.getpid(),
+        'time': time.time(),
+        'stats': get_call_stats(),
+    }
+    with open(filename, 'w') as fp:
+        json.dump(data, fp, indent=2, sort_keys=True)
+
+def _dump_at_exit():
+    for filename in _stats_files:
+        try:
+            dump_call_stats(filename)
+        except (IOError, OSError):
+            pass
+
+if os.environ.get('C4DTOOLS_LIBRARY_STATS'):
+    enable_call_stats(os.environ['C4DTOOLS_LIBRARY_STATS'])
@@ -39,6 +39,136 @@ c4dtools.plugins
 import os
 import sys
 import c4d
+import json
+import threading
+
+from c4dtools import tracing
+from c4dtools import startup
+
+# Process-wide cache of the decoded icons by their normalized filename
+# and fingerprint, and events for the icons that are being decoded.
+_icon_cache = {}
+_icon_events = {}
+_icon_lock = threading.Lock()
+
+def _get_icon_key(filename):
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    path = os.path.normcase(os.path.abspath(filename))
+    return (path, st.st_mtime, st.st_size)
+
+def load_icon(filename):
+    r"""
+    *New in 1.3.2*. Returns a :class:`c4d.bitmaps.BaseBitmap` initialized
+    with the image file *filename*. Successfully decoded images are cached
+    process-wide by their filename, modification time and size, so
+    plugins sharing an icon decode it once. If the icon is being decoded
+    by another thread (see :func:`preload_icons`), this function waits
+    for it. The returned bitmap is shared and must not be modified.
+    """
+
+    key = _get_icon_key(filename)
+    if key is None:
+        icon = c4d.bitmaps.BaseBitmap()
+        icon.InitWith(filename)
+        return icon
+
+    while True:
+        with _icon_lock:
+            icon = _icon_cache.get(key)
+            if icon is not None:
+                return icon
+            event = _icon_events.get(key)
+            if event is None:
+                event = _icon_events[key] = threading.Event()
+                break
+
+        # Decoded by another thread, check the cache again.
+        event.wait()
+
+    try:
+        icon = c4d.bitmaps.BaseBitmap()
+        result = icon.InitWith(filename)[0]
+        if result == c4d.IMAGERESULT_OK:
+            with _icon_lock:
+                _icon_cache[key] = icon
+        return icon
+    finally:
+        with _icon_lock:
+            del _icon_events[key]
+        event.set()
+
+def preload_icons(filenames, background=True, plugin=None):
+    r"""
+    *New in 1.3.2*. Decodes the icons *filenames* into the cache of
+    :func:`load_icon`. Entries that are not strings (eg. None or a
+    :class:`c4d.bitmaps.BaseBitmap`) are ignored. With *background*
+    True, the icons are decoded by the worker threads of
+    :mod:`c4dtools.startup` so the image I/O overlaps with the remaining
+    startup work, and a list of the :class:`~c4dtools.startup.Task`
+    objects (submitted for the *plugin* name) is returned. Otherwise,
+    None is returned after the icons have been decoded.
+
+    .. code-block:: python
+
+        c4dtools.plugins.preload_icons([MyCommand.PLUGIN_ICON])
+    """
+
+    filenames = [x for x in filenames if isinstance(x, basestring)]
+
+    if not background:
+        for filename in filenames:
+            load_icon(filename)
+        return None
+
+    return [startup.submit(load_icon, args=(filename,),
+                           name='load icon ' + os.path.basename(filename),
+                           plugin=plugin)
+            for filename in filenames]
+
+def preload_plugin_icons(manifest=None, icons=()):
+    r"""
+    *New in 1.3.2*. Submits the decoding of the command icons of the
+    calling plugin file to the worker threads of :mod:`c4dtools.startup`.
+    Call it right after :func:`c4dtools.prepare` so the icons are
+    decoded while the plugin file continues, eg. with importing its
+    modules. *icons* is a list of icon filenames. If *manifest* is
+    passed, the icons of the commands in the plugin manifest are decoded
+    as well, the manifest is read by a worker thread (see :func:`main`).
+    :func:`main` waits for the icons. Returns a list of the submitted
+    :class:`~c4dtools.startup.Task` objects.
+
+    .. code-block:: python
+
+        res, imp = c4dtools.prepare()
+        c4dtools.plugins.preload_plugin_icons(manifest=manifest)
+        # ...
+        c4dtools.plugins.main(manifest=manifest, modules=['mycommands'],
+                              importer=imp)
+    """
+
+    filename = sys._getframe(1).f_globals.get('__file__')
+    plugin = tracing.get_plugin_name(filename) if filename else None
+
+    tasks = preload_icons(icons, plugin=plugin)
+    if manifest:
+        tasks.append(startup.submit(_load_manifest_icons, args=(manifest,),
+                                    name='load manifest icons',
+                                    plugin=plugin))
+    return tasks
+
+def _load_manifest_icons(manifest):
+    r"""
+    Private. Decodes the icons of the commands in the plugin manifest
+    *manifest* if it is up to date.
+    """
+
+    data = load_manifest(manifest)
+    if data is not None:
+        preload_icons([entry['icon'] for entry in data['commands']],
+                      background=False)
 
 class Command(c4d.plugins.CommandData):
     r"""
@@ -55,6 +185,9 @@ class Command(c4d.plugins.CommandData):
     - PLUGIN_HELP
     - PLUGIN_INFO [optional]
     - PLUGIN_ICON [optional]
+
+    *Changed in 1.3.2*: If ``PLUGIN_ICON`` is a filename, the icon is
+    loaded with :func:`load_icon`.
     """
 
     # This attribute is set from `c4dtools.plugins.main()`.
@@ -84,8 +217,7 @@ class Command(c4d.plugins.CommandData):
             if isinstance(self.PLUGIN_ICON, c4d.bitmaps.BaseBitmap):
                 icon = self.PLUGIN_ICON
             else:
-                icon = c4d.bitmaps.BaseBitmap()
-                icon.InitWith(self.PLUGIN_ICON)
+                icon = load_icon(self.PLUGIN_ICON)
         else:
             icon = None
 
@@ -113,15 +245,369 @@ def gather_subclasses(clazz):
 
     return classes
 
-def main():
+class LazyCommand(c4d.plugins.CommandData):
+    r"""
+    *New in 1.3.2*. Registered by :func:`main` for a command from the
+    plugin manifest. The module implementing the command is imported
+    and the command is created when Cinema 4D calls one of the methods
+    for the first time, the calls are forwarded to it.
+
+    .. attribute:: entry
+
+        The dictionary describing the command in the manifest.
+
+    .. attribute:: command
+
+        The :class:`Command` instance or None if it has not been
+        loaded yet.
+    """
+
+    def __init__(self, entry, importer=None):
+        super(LazyCommand, self).__init__()
+        self.entry = entry
+        self.importer = importer
+        self.command = None
+
+    def load(self):
+        r"""
+        Returns the :class:`Command` instance, loading it if necessary.
+        """
+
+        if self.command is None:
+            module = _import_module(self.entry['module'], self.importer)
+            cls = getattr(module, self.entry['class'])
+            command = cls()
+            cls.tried_register = True
+            cls.is_registered = True
+            cls.registered_instance = command
+            self.command = command
+        return self.command
+
+    def Execute(self, doc):
+        return self.load().Execute(doc)
+
+    def ExecuteOptionID(self, doc, plugid, subid):
+        return self.load().ExecuteOptionID(doc, plugid, subid)
+
+    def RestoreLayout(self, secret):
+        return self.load().RestoreLayout(secret)
+
+# The methods of a Command that Cinema 4D calls before the command is
+# executed. Commands implementing them are not loaded lazily.
+_eager_methods = ('GetState', 'GetSubContainer', 'ExecuteSubID')
+
+def _import_module(name, importer=None):
+    if importer is not None:
+        return importer.import_(name)
+    __import__(name)
+    return sys.modules[name]
+
+def _get_source_file(module):
+    return _get_source_filename(getattr(module, '__file__', None))
+
+def _get_source_filename(filename):
+    if filename and os.path.splitext(filename)[1] in ('.pyc', '.pyo'):
+        filename = filename[:-1]
+    return filename
+
+def _in_modules(cls, modules):
+    r"""
+    Private. Returns True if the class *cls* is defined in one of the
+    *modules* or in a submodule of them.
+    """
+
+    prefixes = tuple(name + '.' for name in modules)
+    return cls.__module__ in modules or cls.__module__.startswith(prefixes)
+
+def _get_module_snapshot(importer):
+    r"""
+    Private. Returns the state passed to :func:`_get_loaded_files`.
+    """
+
+    if importer is None:
+        return (set(sys.modules), 0, set())
+    return (set(sys.modules), len(importer.trace),
+            set(importer.modules or ()))
+
+def _get_loaded_files(snapshot, importer, dirname):
+    r"""
+    Private. Returns the source files of the modules loaded since the
+    *snapshot* was taken: the modules loaded through the *importer* and
+    the new modules in ``sys.modules`` located in *dirname*.
+    """
+
+    names, trace_length, stored = snapshot
+    files = set()
+    prefix = os.path.join(os.path.abspath(dirname), '')
+    for name in set(sys.modules) - names:
+        filename = _get_source_file(sys.modules[name])
+        if filename and os.path.abspath(filename).startswith(prefix):
+            files.add(filename)
+
+    if importer is not None:
+        for name, filename in importer.trace[trace_length:]:
+            files.add(_get_source_filename(filename))
+        modules = importer.modules or {}
+        for name in set(modules) - stored:
+            files.add(_get_source_file(modules[name]))
+
+    files.discard(None)
+    return files
+
+def _get_file_entry(filename, dirname):
+    st = os.stat(filename)
+    return {
+        'filename': _relpath(filename, dirname),
+        'mtime': st.st_mtime,
+        'size': st.st_size,
+    }
+
+def _check_file_entry(entry, dirname):
+    st = os.stat(os.path.join(dirname, entry['filename']))
+    return [st.st_mtime, st.st_size] == [entry['mtime'], entry['size']]
+
+def _relpath(path, start):
+    r"""
+    Private. Returns *path* relative to *start* if it is inside of
+    *start*, otherwise the absolute path.
+    """
+
+    path = os.path.abspath(path)
+    relpath = os.path.relpath(path, start)
+    if relpath.startswith(os.pardir):
+        return path
+    return relpath
+
+def load_manifest(filename, modules=None):
+    r"""
+    *New in 1.3.2*. Loads the plugin manifest *filename* written by
+    :func:`save_manifest`. Returns None if the file does not exist, is
+    invalid, if any of the recorded source files has been modified
+    since the manifest was written or if *modules* is not None and the
+    manifest has been written for other module names.
+    """
+
+    try:
+        with open(filename) as fp:
+            data = json.load(fp)
+        if data.get('version') != 2:
+            return None
+        if modules is not None and data['requested'] != list(modules):
+            return None
+
+        dirname = os.path.dirname(os.path.abspath(filename))
+        entries = data['modules'].values() + data['files']
+        if not all(_check_file_entry(entry, dirname) for entry in entries):
+            return None
+
+        # Cinema 4D expects the strings UTF-8 encoded.
+        for entry in data['commands']:
+            for key in ('module', 'class', 'name', 'help', 'icon'):
+                if isinstance(entry[key], unicode):
+                    entry[key] = entry[key].encode('utf-8')
+            if entry['icon']:
+                entry['icon'] = os.path.join(dirname, entry['icon'])
+        return data
+    except (IOError, OSError, ValueError, KeyError, TypeError,
+            AttributeError):
+        return None
+
+def save_manifest(filename, command_classes, importer=None, modules=(),
+                  files=()):
+    r"""
+    *New in 1.3.2*. Writes the plugin manifest *filename* for the
+    :class:`Command` subclasses *command_classes*. For each command,
+    the manifest contains the ``PLUGIN_*`` attributes and the module and
+    name of the class. The source files of the modules and the
+    additional source *files* (eg. of the other modules loaded by
+    importing the command modules) are recorded with their modification
+    time and size to validate the manifest. The names of the imported
+    *modules* are recorded to validate the manifest, too.
+
+    Returns True on success and False if the manifest could not be
+    written or if a command can not be described by the manifest (eg.
+    because its ``PLUGIN_ICON`` is a bitmap or its module has no
+    source file). The *importer* is used to look up the modules of the
+    classes if they have been imported with it.
+    """
+
+    dirname = os.path.dirname(os.path.abspath(filename))
+    module_entries = {}
+    commands = []
+    for cls in command_classes:
+        module = sys.modules.get(cls.__module__)
+        if module is None and importer is not None and importer.modules:
+            module = importer.modules.get(cls.__module__)
+        source = _get_source_file(module)
+        if not source or not os.path.isfile(source):
+            return False
+
+        icon = cls.PLUGIN_ICON
+        if icon is not None and not isinstance(icon, basestring):
+            return False
+
+        module_entries[cls.__module__] = _get_file_entry(source, dirname)
+
+        eager = False
+        for klass in cls.__mro__:
+            if issubclass(klass, Command) and klass is not Command:
+                eager = eager or any(name in vars(klass)
+                                     for name in _eager_methods)
+
+        commands.append({
+            'module': cls.__module__,
+            'class': cls.__name__,
+            'id': cls.PLUGIN_ID,
+            'name': cls.PLUGIN_NAME,
+            'help': cls.PLUGIN_HELP,
+            'info': cls.PLUGIN_INFO,
+            'icon': _relpath(icon, dirname) if icon else None,
+            'lazy': not eager,
+        })
+
+    recorded = set(entry['filename'] for entry in module_entries.values())
+    file_entries = []
+    for source in sorted(files):
+        if _relpath(source, dirname) in recorded:
+            continue
+        try:
+            file_entries.append(_get_file_entry(source, dirname))
+        except OSError:
+            return False
+
+    data = {
+        'version': 2,
+        'requested': list(modules),
+        'modules': module_entries,
+        'files': file_entries,
+        'commands': commands,
+    }
+    temp_name = '%s.%d.tmp' % (filename, os.getpid())
+    try:
+        with open(temp_name, 'w') as fp:
+            json.dump(data, fp, indent=2, sort_keys=True)
+        if os.path.exists(filename):
+            os.remove(filename)
+        os.rename(temp_name, filename)
+    except (IOError, OSError):
+        try:
+            os.remove(temp_name)
+        except OSError:
+            pass
+        return False
+    return True
+
+def _register_manifest(data, importer, preload, plugin):
+    r"""
+    Private. Registers the commands from the manifest *data*.
+    """
+
+    commands = data['commands']
+    if preload:
+        preload_icons([entry['icon'] for entry in commands], plugin=plugin)
+
+    for entry in commands:
+        with tracing.span('register ' + entry['name'], id=entry['id'],
+                          lazy=entry['lazy']):
+            _register_entry(entry, importer)
+
+def _register_entry(entry, importer):
+    if not entry['lazy']:
+        module = _import_module(entry['module'], importer)
+        getattr(module, entry['class'])().register()
+        return
+
+    icon = load_icon(entry['icon']) if entry['icon'] else None
+    c4d.plugins.RegisterCommandPlugin(
+        entry['id'], entry['name'], entry['info'], icon, entry['help'],
+        LazyCommand(entry, importer))
+
+def main(preload=False, manifest=None, modules=(), importer=None):
     r"""
     Gathers all subclasses of the plugin classes in this module and
     registers them to Cinema 4D unless `autoregister` evaluates to
     False.
+
+    *New in 1.3.2*: If *preload* is True (False by default), the icons of
+    the commands are decoded by worker threads while the commands are
+    registered, see :func:`preload_icons` and :func:`preload_plugin_icons`
+    to start earlier. The registration is recorded by
+    :mod:`c4dtools.tracing` and ends the span of the plugin. The
+    registration waits for the tasks the plugin submitted to
+    :mod:`c4dtools.startup`.
+
+    *New in 1.3.2*: The names of the modules implementing the commands
+    can be passed with *modules*, they are imported before the
+    subclasses are gathered (with the *importer* if one is passed). If
+    *manifest* is a filename, the commands are registered from the
+    manifest if it is up to date and the modules are only imported when
+    a command is executed, see :class:`LazyCommand`. Otherwise the
+    commands are registered normally and the manifest is written, see
+    :func:`save_manifest`. The manifest describes the commands from the
+    *modules*, it is outdated when other module names are passed or a
+    source file of the modules loaded by importing them has been
+    modified. Commands defined elsewhere (eg. in the plugin file) are
+    registered normally. Commands implementing ``GetState()``,
+    ``GetSubContainer()`` or ``ExecuteSubID()`` are always loaded on
+    registration.
+
+    .. code-block:: python
+
+        res, imp = c4dtools.prepare()
+        c4dtools.plugins.main(manifest=os.path.join(dirname, 'plugin.json'),
+                              modules=['mycommands'], importer=imp)
     """
 
-    for command_class in gather_subclasses(Command):
-        command = command_class()
-        command.register()
+    filename = sys._getframe(1).f_globals.get('__file__')
+    plugin = tracing.get_plugin_name(filename) if filename else None
+    with tracing.span('plugins.main', plugin=plugin):
+        _main(preload, manifest, modules, importer, plugin)
+    if plugin:
+        tracing.end_plugin(plugin)
+
+def _main(preload, manifest, modules, importer, plugin):
+    # The modules and the resource of the plugin may still be prepared
+    # by the worker threads, see c4dtools.prepare().
+    if plugin:
+        startup.wait(plugin)
+
+    if manifest:
+        with tracing.span('load manifest', plugin=plugin) as span:
+            data = load_manifest(manifest, modules)
+            span.set(valid=data is not None)
+        if data is not None:
+            # Commands that are not described by the manifest, eg. the
+            # ones defined in the plugin file.
+            command_classes = [cls for cls in gather_subclasses(Command)
+                               if not _in_modules(cls, modules)]
+            _register_classes(command_classes, preload, plugin)
+            _register_manifest(data, importer, preload, plugin)
+            return
+
+    snapshot = _get_module_snapshot(importer)
+    for name in modules:
+        with tracing.span('import ' + name, 'import', plugin=plugin):
+            _import_module(name, importer)
+
+    command_classes = gather_subclasses(Command)
+    _register_classes(command_classes, preload, plugin)
+
+    if manifest:
+        dirname = os.path.dirname(os.path.abspath(manifest))
+        files = _get_loaded_files(snapshot, importer, dirname)
+        command_classes = [cls for cls in command_classes
+                           if _in_modules(cls, modules)]
+        save_manifest(manifest, command_classes, importer, modules, files)
+
+def _register_classes(command_classes, preload, plugin):
+    if preload:
+        preload_icons([cls.PLUGIN_ICON for cls in command_classes],
+                      plugin=plugin)
+
+    for command_class in command_classes:
+        with tracing.span('register ' + command_class.PLUGIN_NAME,
+                          id=command_class.PLUGIN_ID):
+            command = command_class()
+            command.register()
 
 
@@ -39,13 +39,16 @@ c4dtools.resource
 import os
 import re
 import c4d
+import glob
 import json
 import inspect
 import warnings
 import functools
+import threading
 
 from c4dtools import utils
 from c4dtools import helpers
+from c4dtools import tracing
 
 def load(filename, use_cache=True, cache_suffix='cache'):
     r"""
@@ -63,6 +66,9 @@ def load(filename, use_cache=True, cache_suffix='cache'):
     three values instead of two. The ``missing_permissions`` element has been
     added to the end of the tuple.
 
+    *Changed in 1.3.2*: Loading the symbols is recorded by
+    :mod:`c4dtools.tracing`.
+
     .. note::
 
         The ``missing_permissions`` element of the returned tuple is only
@@ -74,6 +80,12 @@ def load(filename, use_cache=True, cache_suffix='cache'):
               file.
     """
 
+    with tracing.span('load symbols', filename=filename) as span:
+        result = _load(filename, use_cache, cache_suffix)
+        span.set(cache_changed=result[1], missing_permissions=result[2])
+        return result
+
+def _load(filename, use_cache, cache_suffix):
     if not os.path.isfile(filename):
         raise OSError('passed filename does not exist or does not point to '
                       'a file: %s' % filename)
@@ -109,6 +121,7 @@ def load(filename, use_cache=True, cache_suffix='cache'):
 
             load_from_source = False
             symbols = data
+            tracing.instant('symbol cache hit', filename=filename)
         elif data is not None:
             message = 'loaded %s, expected dict from JSON. Loading symbols ' \
                       'from source.'
@@ -126,6 +139,7 @@ def load(filename, use_cache=True, cache_suffix='cache'):
 
         # If the cache should be used, we will now generate it.
         if use_cache:
+            tracing.instant('symbol cache miss', filename=filename)
             try:
                 with open(cache_name, 'wb') as cache_fp:
                     json.dump(symbols, cache_fp)
@@ -236,7 +250,8 @@ class Resource(object):
 
     @classmethod
     def from_resource_folder(cls, dirname, c4dres, cache=True,
-                             parse_description=False):
+                             parse_description=False, background=False,
+                             plugin=None):
         r"""
         *New in 1.3.1* Parses a Cinema 4D resource folder structure and
         its descriptions and returns a :class:`Resource` instance.
@@ -253,6 +268,16 @@ class Resource(object):
         :param parse_description: If this parameter is passed a True
                 value, the description resources are parsed additionally
                 to the ``c4d_symbols.h`` file.
+        :param background: *New in 1.3.2*. If this parameter is passed a
+                True value, the symbols are loaded by a worker thread of
+                :mod:`c4dtools.startup` and the function returns without
+                waiting for them. The returned instance waits for the
+                symbols when they are accessed first or :meth:`wait` is
+                called, errors raised while loading them are raised at
+                that point.
+        :param plugin: *New in 1.3.2*. The name of the plugin the worker
+                thread task is submitted for, see
+                :func:`c4dtools.startup.submit`.
         :raise OSError: If *dirname* does not point to a directory.
         """
 
@@ -260,6 +285,14 @@ class Resource(object):
             raise OSError("'%s' is not a directory." % dirname)
 
         res = cls(dirname, c4dres, {})
+        if background:
+            from c4dtools import startup
+            res._pending_lock = threading.Lock()
+            res._pending = startup.submit(
+                    cls.from_resource_folder,
+                    args=(dirname, None, cache, parse_description),
+                    name='load resource', plugin=plugin)
+            return res
 
         c4d_symbols = os.path.join(dirname, 'c4d_symbols.h')
         if not os.path.isfile(c4d_symbols):
@@ -272,7 +305,7 @@ class Resource(object):
         if parse_description:
             files = glob.glob(os.path.join(dirname, 'description', '*.h'))
             for filename in files:
-                res, changed, perms = load(filename, cache)
+                symbols, changed, perms = load(filename, cache)
                 res.add_symbols(symbols)
                 res.changed |= changed
                 missing_permissions |= perms
@@ -289,6 +322,10 @@ class Resource(object):
         self.changed = False
         self.missing_permissions = False
 
+    # The worker thread task loading the symbols, see
+    # from_resource_folder().
+    _pending = None
+
     def __getattr__(self, name):
         return self.symbols[name]
 
@@ -307,13 +344,78 @@ class Resource(object):
 
         return self.string.get(name)(*args)
 
+    def wait(self):
+        r"""
+        *New in 1.3.2*. Waits for the symbols that are loaded by a worker
+        thread (see :meth:`from_resource_folder`) and takes them over.
+        Errors raised while loading them are raised by this method. Does
+        nothing if the symbols are not loaded in the background.
+        """
+
+        if self._pending is None:
+            return
+
+        with self._pending_lock:
+            task = self._pending
+            if task is None:
+                return
+            with tracing.span('wait for resource', res=self.dirname):
+                loaded = task.result()
+            self._symbols = loaded._symbols
+            self._highest_symbol = loaded._highest_symbol
+            self._changed = loaded._changed
+            self._missing_permissions = loaded._missing_permissions
+            self._pending = None
+
+    def _cancel(self):
+        r"""
+        Private. Drops the symbols that are loaded by a worker thread,
+        they are replaced by the caller.
+        """
+
+        if self._pending is not None:
+            with self._pending_lock:
+                self._pending = None
+
+    @property
+    def changed(self):
+        self.wait()
+        return self._changed
+
+    @changed.setter
+    def changed(self, changed):
+        self.wait()
+        self._changed = changed
+
+    @property
+    def missing_permissions(self):
+        self.wait()
+        return self._missing_permissions
+
+    @missing_permissions.setter
+    def missing_permissions(self, missing_permissions):
+        self.wait()
+        self._missing_permissions = missing_permissions
+
+    @property
+    def highest_symbol(self):
+        self.wait()
+        return self._highest_symbol
+
+    @highest_symbol.setter
+    def highest_symbol(self, highest_symbol):
+        self.wait()
+        self._highest_symbol = highest_symbol
+
     @property
     def symbols(self):
+        self.wait()
         return self._symbols
 
     @symbols.setter
     def symbols(self, symbols):
-        self.highest_symbol = -100000
+        self._cancel()
+        self._highest_symbol = -100000
         self._symbols = {}
         self.add_symbols(symbols)
 
@@ -339,6 +441,7 @@ class Resource(object):
         utils.ensure_type(symbols, dict)
 
         res_symbols = self.symbols
+        highest_symbol = self._highest_symbol
         for key, value in symbols.iteritems():
             utils.ensure_type(key, basestring, name='dict-key')
             utils.ensure_type(value, int, name='dict-value')
@@ -346,9 +449,10 @@ class Resource(object):
                 msg = 'key %r already defined in the resource and ' \
                       'the value differs from the updating symbols.'
                 raise KeyError(msg % key)
-            if value > self.highest_symbol:
-                self.highest_symbol = value
+            if value > highest_symbol:
+                highest_symbol = value
 
+        self._highest_symbol = highest_symbol
         res_symbols.update(symbols)
 
     def new_symbols(self, *symbols):
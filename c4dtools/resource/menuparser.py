@@ -92,9 +92,9 @@ This is how to read the menu resource:
 
 .. warning::
 
-    The :mod:`c4dtools.resource.menuparser` module requires the :mod:`scan` 
-    module. This is why this module is not imported implicitly with the
-    :mod:`c4dtools` module. You have to import it explicitly:
+    The :mod:`c4dtools.resource.menuparser` module is not imported
+    implicitly with the :mod:`c4dtools` module. You have to import it
+    explicitly:
 
     .. code-block:: python
 
@@ -102,15 +102,27 @@ This is how to read the menu resource:
         # or
         from c4dtools.resource import menuparser
 
-    The :mod:`scan` module can be obtained from `github
+    The :class:`MenuSet` and :class:`MenuParser` classes require the
+    :mod:`scan` module, which can be obtained from `github
     <https://github.com/NiklasRosenstein/py-scan>`_. The minimum version
     required is 0.4.5.
 
+*Changed in 1.3.2*: The parsing functions use the streaming
+:class:`MenuTokenizer` and :class:`MenuStreamParser` instead of the
+:mod:`scan` based :class:`MenuParser`. The file is read in chunks and
+the menu tree is built, rendered and searched without recursion, so
+large and deeply nested menus can be used. Syntax errors raise
+:class:`MenuSyntaxError`, which is also a subclass of
+``scan.UnexpectedTokenError`` if :mod:`scan` is installed. The
+:mod:`scan` module is only required for the :class:`MenuSet` and
+:class:`MenuParser` classes.
 """
 
+import re
 import c4d
-import scan
 import string
+import weakref
+import collections
 
 from c4dtools.resource import Resource
 
@@ -119,7 +131,28 @@ try:
 except ImportError:
     import StringIO
 
-assert scan.__version__ >= (0, 4, 5), "Require scan version 0.4.5 or higher"
+try:
+    import scan
+    _UnexpectedTokenError = scan.UnexpectedTokenError
+except ImportError:
+    scan = None
+    _UnexpectedTokenError = Exception
+
+class MenuValidationError(AttributeError):
+    r"""
+    *New in 1.3.2*. Raised by :meth:`MenuNode.validate` when the resource
+    does not provide all symbols required by the menu tree.
+
+    .. attribute:: missing
+
+        A list of the names of all missing symbols.
+    """
+
+    def __init__(self, missing):
+        message = 'Resource does not have required symbols %s' % \
+                  ', '.join(repr(symbol) for symbol in missing)
+        super(MenuValidationError, self).__init__(message)
+        self.missing = missing
 
 class MenuNode(object):
 
@@ -146,9 +179,66 @@ class MenuNode(object):
 
         return False
 
+    def _required_symbols(self):
+        r"""
+        Private. Returns a list of the resource symbols required to
+        render the node.
+        """
+
+        return []
+
+    def _render(self, dialog, res, validated):
+        r"""
+        Private. Renders the node, skipping the symbol checks when
+        *validated* is True, ie. when the node is part of a tree that
+        has been validated against *res*.
+        """
+
+        self.render(dialog, res)
+
+    def _render_popup(self, container, res, validated):
+        r"""
+        Private. Adds the node to the popup-menu *container*. See
+        :meth:`MenuContainer.render_popup`.
+        """
+
+        pass
+
     def render(self, dialog, res):
         pass
 
+    def validate(self, res):
+        r"""
+        *New in 1.3.2*. Checks the tree against the resource *res* and
+        raises :class:`MenuValidationError` listing all symbols the
+        resource does not provide. On success, the containers in the tree
+        are marked as validated and are rendered with *res* without
+        checking each symbol again. The mark is removed from a container
+        and its parents when it is modified through :meth:`add` or
+        :meth:`remove`.
+        """
+
+        missing = []
+        seen = set()
+        containers = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            for symbol in node._required_symbols():
+                if symbol not in seen and not res.has_symbol(symbol):
+                    missing.append(symbol)
+                seen.add(symbol)
+
+            if isinstance(node, MenuContainer):
+                containers.append(node)
+                stack.extend(reversed(node._view()))
+
+        if missing:
+            raise MenuValidationError(missing)
+
+        for container in containers:
+            container._validated = res
+
     def find_node(self, node_id, res):
         r"""
         New in 1.2.7. Find a node by it's identifier.
@@ -156,6 +246,17 @@ class MenuNode(object):
 
         return None
 
+    def _find_path(self, node_id, res):
+        r"""
+        Private. Returns the reversed list of child indices leading to
+        the node with the passed identifier, or None if the node could
+        not be found.
+        """
+
+        if self.find_node(node_id, res) is not None:
+            return []
+        return None
+
     def remove(self):
         r"""
         New in 1.2.8. Remove the node from the tree.
@@ -171,6 +272,33 @@ class MenuNode(object):
         """
         raise NotImplementedError
 
+class _ChildList(list):
+    r"""
+    Private. The list of child nodes of a :class:`MenuContainer`. Reading
+    the list does not affect the container, the methods modifying it
+    prepare the container for the modification first, see
+    :meth:`MenuContainer._prepare_write`.
+    """
+
+    def __init__(self, container, children=()):
+        super(_ChildList, self).__init__(children)
+        self.container = container
+
+    def _writer(name):
+        method = getattr(list, name)
+        def wrapper(self, *args):
+            self.container._prepare_write()
+            return method(self, *args)
+        wrapper.__name__ = name
+        return wrapper
+
+    for _name in ('append', 'extend', 'insert', 'pop', 'remove', 'reverse',
+                  'sort', '__setitem__', '__delitem__', '__setslice__',
+                  '__delslice__', '__iadd__', '__imul__'):
+        locals()[_name] = _writer(_name)
+
+    del _writer, _name
+
 class MenuContainer(MenuNode):
     r"""
     This class represents a container for Cinema 4D dialog menus
@@ -183,50 +311,324 @@ class MenuContainer(MenuNode):
         used to obtain the name of the menu. No sub-menu will be
         created with rendering the instance when this value
         evaluates to False (eg. None value).
+
+    .. attribute:: children
+
+        The list of child nodes. *Changed in 1.3.2*: Modifying or
+        assigning the list is treated like :meth:`add` and :meth:`remove`,
+        see :meth:`copy`. Reading it does not invalidate the validation
+        or the cached popup-menus.
     """
 
     def __init__(self, symbol):
         super(MenuContainer, self).__init__()
-        self.children = []
         self.symbol = symbol
 
+        # The list of child nodes owned by the container, or None if
+        # the container is a lazy copy of the `_source` container.
+        self._children = _ChildList(self)
+        self._source = None
+
+        # Lazy copies that still read from this container.
+        self._dependents = weakref.WeakSet()
+
+        # The Resource the container has been validated against.
+        self._validated = None
+
+        # Incremented on every modification of the container or one
+        # of its children. Cached popup-menus are bound to a version.
+        self._version = 0
+        self._popup_cache = {}
+
     def __iter__(self):
         # For partial backwards compatibility where MenuParser.parse()
         # return a list.
-        return iter(self.children)
+        return self.iter_children()
+
+    @property
+    def children(self):
+        return self._owned_children()
+
+    @children.setter
+    def children(self, children):
+        # `menu.children += nodes` assigns the list it has modified.
+        if children is self._children:
+            return
+        self._prepare_write()
+        self._children = _ChildList(self, children)
+
+    def iter_children(self):
+        r"""
+        *New in 1.3.2*. Returns an iterator over the child nodes for
+        read-only access. Their :attr:`parent` is this container. If the
+        container is a lazy copy (see :meth:`copy`), only its direct
+        children are copied (lazily for sub-menus), the other copies of
+        the tree are not affected.
+        """
+
+        return iter(self._owned_children())
+
+    def _view(self):
+        r"""
+        Private. Returns the list of child nodes for read-only access.
+        The nodes may belong to the source of a lazy copy.
+        """
+
+        if self._children is None:
+            return self._source._view()
+        return self._children
+
+    def _owned_children(self):
+        r"""
+        Private. Returns the list of child nodes that belong to this
+        container, materializing the container if it is a lazy copy.
+        """
+
+        if self._children is None:
+            self._materialize()
+        return self._children
+
+    def _materialize(self):
+        r"""
+        Private. Replaces the reference to the source container by
+        lazy copies of its children.
+        """
+
+        source = self._source
+        children = []
+        for child in source._view():
+            child = child.copy()
+            child.parent = self
+            children.append(child)
+
+        self._children = _ChildList(self, children)
+        self._source = None
+        source._dependents.discard(self)
+
+    def _detach_dependents(self):
+        r"""
+        Private. Materializes all lazy copies of the container so they
+        are not affected by a modification of it.
+        """
+
+        if not self._dependents:
+            return
+
+        for dependent in list(self._dependents):
+            if dependent._children is None:
+                dependent._materialize()
+        self._dependents.clear()
+
+    def _prepare_write(self):
+        r"""
+        Private. Must be called before the children of the container
+        are modified. Lazy copies of the container and its parents are
+        materialized and the container itself is materialized if it
+        is a lazy copy.
+        """
+
+        path = []
+        detach = False
+        node = self
+        while node is not None:
+            path.append(node)
+            detach = detach or bool(node._dependents)
+            node._validated = None
+            node._version += 1
+            node = node.parent
+
+        # Lazy copies are materialized from the top so they copy the
+        # unmodified children.
+        if detach:
+            for node in reversed(path):
+                node._detach_dependents()
+
+        self._owned_children()
 
     def add(self, child):
         self.children.append(child)
         child.parent = self
 
-    def render(self, dialog, res):
+    def _add_new(self, child):
+        r"""
+        Private. Adds a node to a container that has just been created,
+        eg. by the parser. It has no lazy copies, validation or cached
+        popup-menus to take care of.
+        """
+
+        list.append(self._children, child)
+        child.parent = self
+
+    def _required_symbols(self):
         if self.symbol:
-            self._assert_symbol(self.symbol, res)
+            return [self.symbol]
+        return []
+
+    def _begin_render(self, dialog, res, validated):
+        if self.symbol:
+            if not validated:
+                self._assert_symbol(self.symbol, res)
             dialog.MenuSubBegin(res.string.get(self.symbol)())
+
+    def _end_render(self, dialog):
+        if self.symbol:
+            dialog.MenuSubEnd()
+
+    def _render(self, dialog, res, validated):
+        # The sub-menus are tracked with an explicit stack of child
+        # iterators instead of recursion, like in the parser.
+        self._begin_render(dialog, res, validated)
+        stack = [(self, iter(self._view()))]
         try:
-            for child in self.children:
-                child.render(dialog, res)
+            while stack:
+                container, children = stack[-1]
+                for child in children:
+                    if isinstance(child, MenuContainer):
+                        child._begin_render(dialog, res, validated)
+                        stack.append((child, iter(child._view())))
+                        break
+                    child._render(dialog, res, validated)
+                else:
+                    stack.pop()
+                    container._end_render(dialog)
         finally:
-            if self.symbol:
-                dialog.MenuSubEnd()
+            # Close the sub-menus that are still open on an error.
+            for container, children in reversed(stack):
+                container._end_render(dialog)
 
-    def find_node(self, node_id, res):
+    def _begin_popup(self, container, res, validated):
+        r"""
+        Private. Returns the container the children are added to by
+        :meth:`_render_popup`.
+        """
+
+        if not self.symbol:
+            return container
+        if not validated:
+            self._assert_symbol(self.symbol, res)
+        sub = c4d.BaseContainer()
+        sub.InsData(1, res.string.get(self.symbol)())
+        return sub
+
+    def _end_popup(self, container, sub, res):
+        if self.symbol:
+            container.SetContainer(res.get(self.symbol), sub)
+
+    def _render_popup(self, container, res, validated):
+        stack = [(self, container, self._begin_popup(container, res,
+                                                      validated),
+                  iter(self._view()))]
+        while stack:
+            node, parent_sub, sub, children = stack[-1]
+            for child in children:
+                if isinstance(child, MenuContainer):
+                    stack.append((child, sub, child._begin_popup(
+                            sub, res, validated), iter(child._view())))
+                    break
+                child._render_popup(sub, res, validated)
+            else:
+                stack.pop()
+                node._end_popup(parent_sub, sub, res)
+
+    def render(self, dialog, res):
+        self._render(dialog, res, self._validated is res)
+
+    def render_popup(self, res, language=None):
+        r"""
+        *New in 1.3.2*. Renders the menu tree into a
+        :class:`c4d.BaseContainer` that can be passed to
+        :func:`c4d.gui.ShowPopupDialog`. If the container has a symbol,
+        it is added as a sub-menu.
+
+        The result is cached for the current version of the tree and
+        *language*, a subsequent call returns the same container unless
+        the tree has been modified through :meth:`add` or :meth:`remove`.
+        Pass the current language (eg. the name of the strings folder)
+        as *language* when it can change during the session. The
+        returned container must not be modified.
+        """
+
+        # Containers of previous versions will not be used again.
+        key = (self._version, language)
+        if any(k[0] != self._version for k in self._popup_cache):
+            self._popup_cache = {}
+
+        cached = self._popup_cache.get(key)
+        if cached and cached[0] is res:
+            return cached[1]
+
+        container = c4d.BaseContainer()
+        self._render_popup(container, res, self._validated is res)
+        self._popup_cache[key] = (res, container)
+        return container
+
+    def _find_path(self, node_id, res):
         if self._compare_symbol(node_id, res):
-            return self
+            return []
+
+        # Depth-first search with an explicit stack. `indices` holds the
+        # index of the sub-menu that is searched on each level.
+        indices = []
+        stack = [enumerate(self._view())]
+        while stack:
+            for index, child in stack[-1]:
+                if isinstance(child, MenuContainer):
+                    if child._compare_symbol(node_id, res):
+                        return [index] + indices[::-1]
+                    indices.append(index)
+                    stack.append(enumerate(child._view()))
+                    break
+                if child._find_path(node_id, res) is not None:
+                    return [index] + indices[::-1]
+            else:
+                stack.pop()
+                if indices:
+                    indices.pop()
 
-        for child in self.children:
-            node = child.find_node(node_id, res)
-            if node:
-                return node
+        return None
+
+    def find_node(self, node_id, res):
+        # Search the shared tree first and only materialize the
+        # containers along the path to the found node.
+        path = self._find_path(node_id, res)
+        if path is None:
+            return None
+
+        node = self
+        for index in reversed(path):
+            node = node._owned_children()[index]
+        return node
 
     def copy(self):
+        r"""
+        Returns a copy of the container. *Changed in 1.3.2*: The copy
+        shares the child nodes with the original container until either
+        of them is modified through :meth:`add` and :meth:`remove` (or
+        by modifying :attr:`children`). Only the containers along the
+        path to the modification are copied, making the copy of a
+        menu tree an O(1) operation.
+
+        Note that attributes of the leaf nodes (eg. :attr:`MenuItem.string`)
+        are not tracked. Modify them only on nodes returned by
+        :meth:`find_node` from the tree they belong to.
+        """
+
+        source = self
+        if self._children is None:
+            source = self._source
+
         new = MenuContainer(self.symbol)
-        for child in self.children:
-            new.add(child.copy())
+        new._children = None
+        new._source = source
+        new._validated = self._validated
+        source._dependents.add(new)
         return new
 
 class MenuSeperator(MenuNode):
 
+    def _render_popup(self, container, res, validated):
+        container.InsData(0, '')
+
     def render(self, dialog, res):
         dialog.MenuAddSeparator()
 
@@ -241,14 +643,32 @@ class MenuCommand(MenuNode):
         self.command_id = command_id
         self.symbol = symbol
 
-    def render(self, dialog, res):
+    def _required_symbols(self):
+        if not self.command_id:
+            return [self.symbol]
+        return []
+
+    def _render(self, dialog, res, validated):
         command_id = self.command_id
         if not command_id:
-            self._assert_symbol(self.symbol, res)
+            if not validated:
+                self._assert_symbol(self.symbol, res)
             command_id = res.get(self.symbol)
 
         dialog.MenuAddCommand(command_id)
 
+    def _render_popup(self, container, res, validated):
+        command_id = self.command_id
+        if not command_id:
+            if not validated:
+                self._assert_symbol(self.symbol, res)
+            command_id = res.get(self.symbol)
+
+        container.InsData(command_id, 'CMD')
+
+    def render(self, dialog, res):
+        self._render(dialog, res, False)
+
     def find_node(self, node_id, res):
         if self.command_id and self.command_id == node_id:
             return self
@@ -266,10 +686,22 @@ class MenuString(MenuNode):
         super(MenuString, self).__init__()
         self.symbol = symbol
 
-    def render(self, dialog, res):
-        self._assert_symbol(self.symbol, res)
+    def _required_symbols(self):
+        return [self.symbol]
+
+    def _render(self, dialog, res, validated):
+        if not validated:
+            self._assert_symbol(self.symbol, res)
         dialog.MenuAddString(*res.string.get(self.symbol).both)
 
+    def _render_popup(self, container, res, validated):
+        if not validated:
+            self._assert_symbol(self.symbol, res)
+        container.InsData(*res.string.get(self.symbol).both)
+
+    def render(self, dialog, res):
+        self._render(dialog, res, False)
+
     def find_node(self, node_id, res):
         if self._compare_symbol(node_id, res):
             return self
@@ -297,6 +729,9 @@ class MenuItem(MenuNode):
         self.id = id
         self.string = string
 
+    def _render_popup(self, container, res, validated):
+        container.InsData(self.id, self.string)
+
     def render(self, dialog, res):
         dialog.MenuAddString(self.id, self.string)
 
@@ -307,21 +742,25 @@ class MenuItem(MenuNode):
     def copy(self):
         return MenuItem(self.id, self.string)
 
-class MenuSet(scan.TokenSet):
+# The scan based classes are only available with scan installed.
+if scan is not None:
 
-    def on_init(self):
-        digits = string.digits
-        letters = string.letters + '_'
+    class MenuSet(scan.TokenSet):
 
-        self.add('comment', 2, scan.HashComment(skip=True))
-        self.add('menu',    1, scan.Keyword('MENU'))
-        self.add('command', 1, scan.Keyword('COMMAND'))
-        self.add('bopen',   1, scan.Keyword('{'))
-        self.add('bclose',  1, scan.Keyword('}'))
-        self.add('end',     1, scan.Keyword(';'))
-        self.add('sep',     0, scan.CharacterSet('-'))
-        self.add('symbol',  0, scan.CharacterSet(letters, letters + digits))
-        self.add('number',  0, scan.CharacterSet(digits))
+        def on_init(self):
+            digits = string.digits
+            letters = string.letters + '_'
+
+            self.add('comment', 2, scan.HashComment(skip=True))
+            self.add('menu',    1, scan.Keyword('MENU'))
+            self.add('command', 1, scan.Keyword('COMMAND'))
+            self.add('bopen',   1, scan.Keyword('{'))
+            self.add('bclose',  1, scan.Keyword('}'))
+            self.add('end',     1, scan.Keyword(';'))
+            self.add('sep',     0, scan.CharacterSet('-'))
+            self.add('symbol',  0, scan.CharacterSet(letters,
+                                                     letters + digits))
+            self.add('number',  0, scan.CharacterSet(digits))
 
 class MenuParser(object):
 
@@ -397,13 +836,183 @@ class MenuParser(object):
         return menus
 
 
+class MenuSyntaxError(SyntaxError, _UnexpectedTokenError):
+    r"""
+    *New in 1.3.2*. Raised by the :class:`MenuStreamParser` when an
+    unexpected token is encountered. The :attr:`lineno` and :attr:`offset`
+    attributes contain the position of the token. If :mod:`scan` is
+    installed, it is also a subclass of ``scan.UnexpectedTokenError``
+    raised by the :class:`MenuParser`.
+    """
+
+    def __init__(self, message, token=None):
+        super(MenuSyntaxError, self).__init__(message)
+        if token:
+            self.lineno = token.line
+            self.offset = token.column
+
+MenuToken = collections.namedtuple('MenuToken', 'type value line column')
+
+class MenuTokenizer(object):
+    r"""
+    *New in 1.3.2*. Iterable that reads tokens from a file-like object
+    in chunks of *chunk_size* bytes. Only the unprocessed part of the
+    current chunk is kept in memory. Yields :class:`MenuToken` objects,
+    comments and whitespace are skipped.
+
+    The token types are ``'menu'``, ``'command'``, ``'bopen'``,
+    ``'bclose'``, ``'end'``, ``'sep'``, ``'symbol'`` and ``'number'``,
+    equal to the token names of the :class:`MenuSet`.
+    """
+
+    keywords = {'MENU': 'menu', 'COMMAND': 'command'}
+
+    characters = {'{': 'bopen', '}': 'bclose', ';': 'end'}
+
+    regex = re.compile(r"""
+        (?P<space>\s+) |
+        (?P<comment>\#[^\n]*) |
+        (?P<char>[{};]) |
+        (?P<sep>-+) |
+        (?P<symbol>[A-Za-z_][A-Za-z0-9_]*) |
+        (?P<number>[0-9]+)
+    """, re.X)
+
+    def __init__(self, fl, chunk_size=8192):
+        super(MenuTokenizer, self).__init__()
+        self.fl = fl
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        fl = self.fl
+        regex = self.regex
+        buffer = ''
+        pos = 0
+        eof = False
+        line = 1
+        column = 1
+
+        while True:
+            if not eof and len(buffer) - pos < self.chunk_size:
+                data = fl.read(self.chunk_size)
+                buffer = buffer[pos:] + data
+                pos = 0
+                eof = not data
+            if pos >= len(buffer):
+                break
+
+            match = regex.match(buffer, pos)
+            if not match:
+                token = MenuToken(None, buffer[pos], line, column)
+                raise MenuSyntaxError('invalid character %r' % token.value,
+                                      token)
+
+            # A token that reaches the end of the buffer could continue
+            # in the next chunk.
+            end = match.end()
+            if end == len(buffer) and not eof:
+                data = fl.read(self.chunk_size)
+                if data:
+                    buffer = buffer[pos:] + data
+                    pos = 0
+                    continue
+                eof = True
+
+            kind = match.lastgroup
+            value = match.group()
+            if kind == 'char':
+                kind = self.characters[value]
+            elif kind == 'symbol':
+                kind = self.keywords.get(value, kind)
+
+            if kind not in ('space', 'comment'):
+                yield MenuToken(kind, value, line, column)
+
+            newlines = value.count('\n')
+            if newlines:
+                line += newlines
+                column = len(value) - value.rfind('\n')
+            else:
+                column += len(value)
+            pos = end
+
+class MenuStreamParser(object):
+    r"""
+    *New in 1.3.2*. Builds the menu tree from a stream of
+    :class:`MenuToken` objects. Nested menus are tracked with an explicit
+    stack of containers instead of recursion, the parser therefore only
+    keeps the currently open menus in memory.
+    """
+
+    def __init__(self, **options):
+        super(MenuStreamParser, self).__init__()
+        self.options = options
+
+    def __getitem__(self, name):
+        return self.options[name]
+
+    def _expect(self, token, *tokentypes):
+        if not token:
+            raise MenuSyntaxError('unexpected end of file, expected %s' %
+                                  ' or '.join(tokentypes))
+        if token.type not in tokentypes:
+            raise MenuSyntaxError('unexpected %s %r, expected %s' % (
+                    token.type, token.value, ' or '.join(tokentypes)), token)
+        return token
+
+    def parse(self, tokens):
+        tokens = iter(tokens)
+        menus = MenuContainer(None)
+        stack = [menus]
+
+        for token in tokens:
+            kind = token.type
+            if kind == 'menu':
+                symbol = self._expect(next(tokens, None), 'symbol').value
+                self._expect(next(tokens, None), 'bopen')
+                item = MenuContainer(symbol)
+                stack[-1]._add_new(item)
+                stack.append(item)
+                continue
+
+            # Only menus are allowed on the top-level.
+            if len(stack) == 1:
+                self._expect(token, 'menu')
+
+            if kind == 'bclose':
+                stack.pop()
+                continue
+            elif kind == 'command':
+                token = self._expect(next(tokens, None), 'number', 'symbol')
+                if token.type == 'number':
+                    item = MenuCommand(int(token.value), None)
+                else:
+                    item = MenuCommand(None, token.value)
+            elif kind == 'sep':
+                item = MenuSeperator()
+            elif kind == 'symbol':
+                item = MenuString(token.value)
+            else:
+                self._expect(token, 'menu', 'command', 'sep', 'symbol',
+                             'bclose')
+
+            self._expect(next(tokens, None), 'end')
+            stack[-1]._add_new(item)
+
+        if len(stack) > 1:
+            self._expect(None, 'bclose')
+
+        return menus
+
+
 def parse_file(filename):
     r"""
     Parse a ``*.menu`` file from the local file-system. Returns a list
     of :class:`MenuContainer` objects.
     """
 
-    return parse_fileobject(open(filename, 'rb'))
+    with open(filename, 'rb') as fl:
+        return parse_fileobject(fl)
 
 def parse_string(data):
     r"""
@@ -415,22 +1024,24 @@ def parse_string(data):
     fl.seek(0)
     return parse_fileobject(fl)
 
-def parse_fileobject(fl):
+def parse_fileobject(fl, chunk_size=8192):
     r"""
     Parse a file-like object. Returns a list of :class:`MenuContainer`
     objects.
+
+    *Changed in 1.3.2*: The file-object is read in chunks of *chunk_size*
+    bytes instead of reading it completely.
     """
 
-    scanner = scan.Scanner(fl)
-    scanner.read()
-    lexer = scan.Lexer(scanner, MenuSet())
-    lexer.read_token()
-    parser = MenuParser()
-    return parser.parse(lexer)
+    parser = MenuStreamParser()
+    return parser.parse(MenuTokenizer(fl, chunk_size))
 
 def parse_and_prepare(filename, dialog, res):
     r"""
     Like :func:`parse_file`, but renders the parsed menus to the dialog.
+
+    *Changed in 1.3.2*: The menus are validated with
+    :meth:`MenuNode.validate` before rendering.
     """
 
     if not isinstance(dialog, c4d.gui.GeDialog):
@@ -439,6 +1050,7 @@ def parse_and_prepare(filename, dialog, res):
         raise TypeError('Expected c4dtools.resource.Resource as 3rd argument.')
 
     menu = parse_file(filename)
+    menu.validate(res)
     menu.render(dialog, res)
 
 
@@ -0,0 +1,238 @@
+# coding: utf-8
+#
+# Copyright (c) 2012-2013, Niklas Rosenstein
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met: 
+# 
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution. 
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+# 
+# The views and conclusions contained in the software and
+# documentation are those of the authors and should not be interpreted
+# as representing official policies,  either expressed or implied, of
+# the FreeBSD Project.
+r"""
+c4dtools.startup
+~~~~~~~~~~~~~~~~
+
+*New in 1.3.2*. A process-wide pool of worker threads for the I/O bound
+preparation of plugins (loading resource symbols, decoding icons and
+compiling the modules that will be imported). Cinema 4D loads the
+plugins one after another on the main thread. Work that a plugin
+submits early runs in the background while the following plugins are
+loaded, and the registration only waits for the results. The startup
+takes about as long as the slowest plugin instead of the sum of all
+plugins.
+
+The tasks are grouped by the name of the plugin that submitted them
+(see :func:`c4dtools.tracing.get_plugin_name`). :func:`c4dtools.prepare`
+submits the work of a plugin and :func:`c4dtools.plugins.main` waits
+for it before it registers the plugin.
+
+.. code-block:: python
+
+    plugin = c4dtools.tracing.get_plugin_name(__file__)
+    task = c4dtools.startup.submit(load_presets, args=(dirname,),
+                                   name='load presets', plugin=plugin)
+    # ...
+    presets = task.result()
+
+A task that has not been started by a worker thread when it is waited
+for is run by the waiting thread, so the main thread is not idle while
+the workers are busy with other plugins.
+
+Exceptions raised by a task are re-raised by :meth:`Task.result`,
+:func:`wait` ignores them. The preparation is an optimization, the
+work is done again on the main thread if it failed.
+"""
+
+import sys
+import time
+import Queue
+import threading
+
+from c4dtools import tracing
+
+# The maximum number of worker threads. Read when a task is submitted.
+max_workers = 4
+
+_queue = Queue.Queue()
+_workers = []
+_idle = 0
+_lock = threading.Lock()
+
+# Unfinished tasks by the name of the plugin that submitted them.
+_pending = {}
+
+class Task(object):
+    r"""
+    A function submitted to the worker threads with :func:`submit`.
+
+    .. attribute:: name
+
+        The name of the task, used for the trace events.
+
+    .. attribute:: plugin
+
+        The name of the plugin that submitted the task or None.
+    """
+
+    def __init__(self, func, args, kwargs, name, plugin):
+        super(Task, self).__init__()
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.name = name
+        self.plugin = plugin
+        self._event = threading.Event()
+        self._started = False
+        self._result = None
+        self._exc_info = None
+
+    def __repr__(self):
+        state = 'done' if self.done() else 'pending'
+        return '<Task %r of %r (%s)>' % (self.name, self.plugin, state)
+
+    def done(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        r"""
+        Waits until the task is finished or *timeout* seconds passed.
+        Returns True if the task is finished. The task is run by the
+        calling thread if it has not been started yet.
+        """
+
+        if self._claim():
+            self._run()
+        return self._event.wait(timeout)
+
+    def result(self, timeout=None):
+        r"""
+        Waits for the task and returns the value returned by the
+        function. Re-raises the exception raised by the function.
+        Raises RuntimeError if the task did not finish within *timeout*
+        seconds.
+        """
+
+        if not self.wait(timeout):
+            raise RuntimeError('task %r did not finish in time.' % self.name)
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def _claim(self):
+        r"""
+        Private. Returns True if the calling thread may run the task,
+        False if it has been started already.
+        """
+
+        with _lock:
+            if self._started:
+                return False
+            self._started = True
+            return True
+
+    def _run(self):
+        try:
+            with tracing.span(self.name, 'startup', plugin=self.plugin):
+                self._result = self.func(*self.args, **self.kwargs)
+        except Exception:
+            self._exc_info = sys.exc_info()
+        finally:
+            with _lock:
+                tasks = _pending.get(self.plugin)
+                if tasks is not None:
+                    tasks.discard(self)
+                    if not tasks:
+                        del _pending[self.plugin]
+            self._event.set()
+
+def _worker():
+    global _idle
+    while True:
+        task = _queue.get()
+        with _lock:
+            _idle -= 1
+        if task._claim():
+            task._run()
+        del task
+        with _lock:
+            _idle += 1
+
+def submit(func, args=(), kwargs=None, name=None, plugin=None):
+    r"""
+    Calls *func* with *args* and *kwargs* in a worker thread and
+    returns a :class:`Task`. *name* defaults to the name of the
+    function. *plugin* is the name of the plugin the task belongs to,
+    see :func:`wait`. Up to :data:`max_workers` threads are started on
+    demand. They are daemon threads and live until the process exits.
+    """
+
+    global _idle
+    if name is None:
+        name = getattr(func, '__name__', repr(func))
+    task = Task(func, tuple(args), dict(kwargs or {}), name, plugin)
+
+    with _lock:
+        _pending.setdefault(plugin, set()).add(task)
+        if _idle <= _queue.qsize() and len(_workers) < max_workers:
+            thread = threading.Thread(target=_worker,
+                                      name='c4dtools-startup-%d'
+                                      % len(_workers))
+            thread.daemon = True
+            _workers.append(thread)
+            _idle += 1
+            thread.start()
+    _queue.put(task)
+    return task
+
+def wait(plugin=None, timeout=None):
+    r"""
+    Waits for the tasks submitted for *plugin* or for all tasks if
+    *plugin* is None. Returns False if they did not finish within
+    *timeout* seconds, True otherwise. Tasks submitted while waiting
+    are not waited for.
+    """
+
+    with _lock:
+        if plugin is None:
+            tasks = [task for group in _pending.values() for task in group]
+        else:
+            tasks = list(_pending.get(plugin, ()))
+
+    if not tasks:
+        return True
+
+    with tracing.span('wait for startup tasks', 'startup', plugin=plugin,
+                      count=len(tasks)):
+        if timeout is not None:
+            deadline = time.time() + timeout
+        for task in tasks:
+            if timeout is None:
+                task.wait()
+            else:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not task.wait(remaining):
+                    return False
+    return True
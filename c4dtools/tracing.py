@@ -0,0 +1,341 @@
+# coding: utf-8
+#
+# Copyright (c) 2012-2013, Niklas Rosenstein
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met: 
+# 
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer. 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution. 
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+# 
+# The views and conclusions contained in the software and
+# documentation are those of the authors and should not be interpreted
+# as representing official policies,  either expressed or implied, of
+# the FreeBSD Project.
+r"""
+c4dtools.tracing
+~~~~~~~~~~~~~~~~
+
+*New in 1.3.2*. Opt-in tracing of the plugin startup. When enabled, the
+library records spans for :func:`c4dtools.prepare` (loading the
+resource symbols including cache hits and misses and setting up the
+Importer), the modules imported through an
+:class:`~c4dtools.importer.Importer` and the registration in
+:func:`c4dtools.plugins.main`. The events are written to a file in the
+Chrome trace event format that can be opened with ``chrome://tracing``
+or other trace viewers.
+
+Every plugin gets an asynchronous span from the call of
+:func:`c4dtools.prepare` until :func:`c4dtools.plugins.main` returned,
+so the startup of all plugins can be inspected in a single trace. To
+trace the startup of Cinema 4D, set the ``C4DTOOLS_TRACE`` environment
+variable to the output filename. ``{pid}`` in the filename is replaced
+by the process id. Plugins that bundle their own copy of
+:mod:`c4dtools` write to the same file through a shared
+:class:`Tracer`.
+
+.. code-block:: python
+
+    from c4dtools import tracing
+    tracing.enable('/tmp/c4d-startup.json')
+
+    with tracing.span('load textures', count=len(textures)):
+        load_textures(textures)
+
+Events are appended to the file as they complete, it is a valid trace
+at any time (the closing bracket of the JSON array is optional in the
+format).
+"""
+
+import os
+import sys
+import json
+import types
+import atexit
+import timeit
+import threading
+
+# The active Tracer or None.
+_tracer = None
+
+# The Tracers of the process by their filename and the lock protecting
+# them. Kept in a module in `sys.modules` to be shared with the copies
+# of c4dtools bundled with other plugins, see enable().
+_shared = sys.modules.setdefault('_c4dtools_tracing_shared',
+                                 types.ModuleType('_c4dtools_tracing_shared'))
+if not hasattr(_shared, 'tracers'):
+    _shared.lock = threading.Lock()
+    _shared.tracers = {}
+
+class Tracer(object):
+    r"""
+    Writes trace events to the file *filename*. Use :func:`enable` to
+    install a tracer that is used by :mod:`c4dtools`.
+    """
+
+    def __init__(self, filename):
+        super(Tracer, self).__init__()
+        self.filename = filename
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._threads = set()
+        self._plugins = set()
+        self.users = 0
+        self._fp = open(filename, 'w')
+        self._fp.write('[\n')
+        self._fp.flush()
+
+    @staticmethod
+    def now():
+        r"""
+        Returns the current time in microseconds.
+        """
+
+        return timeit.default_timer() * 1000000.0
+
+    def _write(self, event):
+        thread = threading.current_thread()
+        event['pid'] = self.pid
+        event['tid'] = thread.ident
+
+        with self._lock:
+            if self._fp is None:
+                return
+            if thread.ident not in self._threads:
+                self._threads.add(thread.ident)
+                self._fp.write(json.dumps({
+                    'name': 'thread_name', 'ph': 'M', 'pid': self.pid,
+                    'tid': thread.ident, 'args': {'name': thread.name},
+                }) + ',\n')
+            self._fp.write(json.dumps(event) + ',\n')
+            self._fp.flush()
+
+    def complete(self, name, cat, start, end, args=None):
+        r"""
+        Writes a span of the current thread that started at *start* and
+        ended at *end* (see :meth:`now`).
+        """
+
+        self._write({'name': name, 'cat': cat, 'ph': 'X', 'ts': start,
+                     'dur': end - start, 'args': args or {}})
+
+    def instant(self, name, cat, args=None):
+        r"""
+        Writes an event without duration.
+        """
+
+        self._write({'name': name, 'cat': cat, 'ph': 'i', 's': 't',
+                     'ts': self.now(), 'args': args or {}})
+
+    def begin_async(self, name, cat, id, args=None):
+        r"""
+        Starts an asynchronous span identified by *cat* and *id*. It can
+        be ended from any thread with :meth:`end_async`.
+        """
+
+        self._write({'name': name, 'cat': cat, 'ph': 'b', 'id': id,
+                     'ts': self.now(), 'args': args or {}})
+
+    def end_async(self, name, cat, id, args=None):
+        self._write({'name': name, 'cat': cat, 'ph': 'e', 'id': id,
+                     'ts': self.now(), 'args': args or {}})
+
+    def begin_plugin(self, plugin, args=None):
+        r"""
+        Starts the asynchronous span of the plugin with the name *plugin*
+        unless it has been started already.
+        """
+
+        with self._lock:
+            if plugin in self._plugins:
+                return
+            self._plugins.add(plugin)
+        self.begin_async(plugin, 'plugin', plugin, args)
+
+    def end_plugin(self, plugin, args=None):
+        r"""
+        Ends the span started with :meth:`begin_plugin` if it has been
+        started and not ended yet.
+        """
+
+        with self._lock:
+            if plugin not in self._plugins:
+                return
+            self._plugins.discard(plugin)
+        self.end_async(plugin, 'plugin', plugin, args)
+
+    def close(self):
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+
+class Span(object):
+    r"""
+    Context manager returned by :func:`span` when tracing is enabled.
+    """
+
+    def __init__(self, tracer, name, cat, args):
+        super(Span, self).__init__()
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = None
+
+    def set(self, **args):
+        r"""
+        Adds arguments to the span.
+        """
+
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = self.tracer.now()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.complete(self.name, self.cat, self.start,
+                             self.tracer.now(), self.args)
+
+class NullSpan(object):
+    r"""
+    Context manager returned by :func:`span` when tracing is disabled.
+    """
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        pass
+
+_null_span = NullSpan()
+
+def enable(filename):
+    r"""
+    Starts writing the trace events to *filename*. A tracer that has
+    been enabled before is disabled. Returns the :class:`Tracer`.
+
+    The tracers are shared process-wide by their filename: the copies of
+    :mod:`c4dtools` bundled with other plugins that enable the same file
+    use the same :class:`Tracer`, the file is only truncated when the
+    first of them enables it.
+    """
+
+    global _tracer
+    filename = filename.replace('{pid}', str(os.getpid()))
+    filename = os.path.abspath(filename)
+    with _shared.lock:
+        tracer = _shared.tracers.get(filename)
+        if tracer is None:
+            tracer = _shared.tracers[filename] = Tracer(filename)
+        tracer.users += 1
+        if _tracer is not None:
+            _release(_tracer)
+        _tracer = tracer
+    return tracer
+
+def disable():
+    r"""
+    Stops tracing. The trace file is closed if no other copy of
+    :mod:`c4dtools` uses it.
+    """
+
+    global _tracer
+    with _shared.lock:
+        if _tracer is not None:
+            _release(_tracer)
+        _tracer = None
+
+def _release(tracer):
+    r"""
+    Private. Closes the *tracer* when it has no users anymore. Must be
+    called with the shared lock held.
+    """
+
+    tracer.users -= 1
+    if tracer.users <= 0:
+        tracer.close()
+        if _shared.tracers.get(tracer.filename) is tracer:
+            del _shared.tracers[tracer.filename]
+
+def is_enabled():
+    return _tracer is not None
+
+def span(name, cat='c4dtools', **args):
+    r"""
+    Returns a context manager recording a span with the *name*, the
+    category *cat* and the arguments *args*. When tracing is disabled,
+    a shared object that does nothing is returned.
+    """
+
+    tracer = _tracer
+    if tracer is None:
+        return _null_span
+    return Span(tracer, name, cat, args)
+
+def instant(name, cat='c4dtools', **args):
+    r"""
+    Records an event without duration if tracing is enabled.
+    """
+
+    tracer = _tracer
+    if tracer is not None:
+        tracer.instant(name, cat, args)
+
+def begin_plugin(plugin, **args):
+    r"""
+    Starts the asynchronous span of the plugin with the name *plugin*
+    unless it has been started already. Called by
+    :func:`c4dtools.prepare`.
+    """
+
+    tracer = _tracer
+    if tracer is not None:
+        tracer.begin_plugin(plugin, args)
+
+def end_plugin(plugin, **args):
+    r"""
+    Ends the span started with :func:`begin_plugin`, if any. Called by
+    :func:`c4dtools.plugins.main`.
+    """
+
+    tracer = _tracer
+    if tracer is not None:
+        tracer.end_plugin(plugin, args)
+
+def get_plugin_name(filename):
+    r"""
+    Returns the name of the plugin for the *filename* of the plugin
+    file, that is the name of the plugin's folder.
+    """
+
+    return os.path.basename(os.path.dirname(os.path.abspath(filename)))
+
+if os.environ.get('C4DTOOLS_TRACE'):
+    enable(os.environ['C4DTOOLS_TRACE'])
+    atexit.register(disable)
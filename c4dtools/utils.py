@@ -1231,9 +1231,15 @@ class TempDoc(object):
                                and_delete, i_am_safe=True)
 
 
-# Backwards compatibility for < 1.3.0
-from c4dtools.math import vmin, vmax, vbbmid
-from c4dtools.importer import Importer
-from c4dtools.decorators import f_attrs as func_attr
+# Backwards compatibility for < 1.3.0. The modules are imported on the
+# first access of the names.
+import c4dtools
+c4dtools._make_lazy(sys.modules[__name__], {
+    'vmin': ('c4dtools.math', 'vmin'),
+    'vmax': ('c4dtools.math', 'vmax'),
+    'vbbmid': ('c4dtools.math', 'vbbmid'),
+    'Importer': ('c4dtools.importer', 'Importer'),
+    'func_attr': ('c4dtools.decorators', 'f_attrs'),
+})
 
 